@@ -0,0 +1,246 @@
+# accounts/log_writer.py
+
+"""
+日志批量写入器
+请求线程只把日志记录放入有界队列，后台线程按条数或时间间隔 bulk_create 写入数据库，
+日志不再占用请求路径上的数据库往返
+"""
+import os
+import time
+import atexit
+import weakref
+import threading
+from collections import deque
+
+from django.db import DatabaseError, close_old_connections
+
+# 队列已满时的处理策略
+POLICIES = ('drop_newest', 'drop_oldest', 'block')
+
+
+class BatchLogWriter:
+    """
+    后台批量写入日志记录
+
+    队列满时按 policy 处理：
+        drop_newest: 丢弃新记录（默认，请求线程不等待）
+        drop_oldest: 丢弃队列中最早的记录，保留最新的日志
+        block: 请求线程最多等待 block_timeout 秒，仍无空间时丢弃新记录
+    写入线程在首次提交时启动；fork 出的 worker 进程重新创建锁、队列和线程。
+    """
+
+    def __init__(self, enabled=True, max_queue=10000, batch_size=200, flush_interval=1.0,
+                 policy='drop_newest', block_timeout=0.05):
+        """
+        Args:
+            enabled: 为False时同步写入（调用方线程直接 create）
+            max_queue: 队列最大记录数
+            batch_size: 每批写入的最大记录数，队列中积累到该数量时立即写入
+            flush_interval: 队列未满一批时的最长写入间隔（秒）
+            policy: 队列满时的处理策略，见 POLICIES
+            block_timeout: block 策略下的最长等待时间（秒）
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"不支持的队列策略: {policy}")
+        self.enabled = enabled
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self._reset()
+        if hasattr(os, 'register_at_fork'):
+            # 父进程 fork 时锁可能正被其他线程持有，子进程中必须换用新锁
+            method = weakref.WeakMethod(self._reset)
+            os.register_at_fork(after_in_child=lambda: method() and method()())
+
+    def _reset(self):
+        """初始化锁、队列、线程状态和计数"""
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._pid = os.getpid()
+        self._thread = None
+        self._stopping = False
+        # 正在写入的记录数，flush() 等待队列清空且没有在写的批次
+        self._writing = 0
+        # 等待中的 flush() 调用数，大于0时写入线程不等待凑满一批
+        self._flushing = 0
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+        self.max_depth = 0
+        self.last_flush_ms = None
+
+    def submit(self, model, **fields):
+        """
+        提交一条日志记录
+
+        Returns:
+            bool: 是否已接收（入队或同步写入成功），被丢弃时返回False
+        """
+        if not self.enabled:
+            model.objects.create(**fields)
+            return True
+        record = model(**fields)
+        self._check_pid()
+        with self._cond:
+            if self._stopping:
+                self.dropped += 1
+                return False
+            self._ensure_thread()
+            if len(self._queue) >= self.max_queue:
+                if self.policy == 'drop_oldest':
+                    self._queue.popleft()
+                    self.dropped += 1
+                elif not (self.policy == 'block' and self._wait_for_space()):
+                    self.dropped += 1
+                    return False
+            self._queue.append(record)
+            self.enqueued += 1
+            self.max_depth = max(self.max_depth, len(self._queue))
+            if self._batch_ready():
+                self._cond.notify_all()
+        return True
+
+    def _check_pid(self):
+        """未经 os.fork 钩子的 fork（如 C 扩展直接 fork）后在子进程中重新初始化"""
+        if self._pid != os.getpid():
+            self._reset()
+
+    def _batch_ready(self):
+        """持锁调用，队列已积累满一批（或队列已满）时立即写入"""
+        return len(self._queue) >= min(self.batch_size, self.max_queue)
+
+    def _wait_for_space(self):
+        """持锁调用，等待队列腾出空间，超时或写入器停止时返回False"""
+        return self._cond.wait_for(
+            lambda: len(self._queue) < self.max_queue or self._stopping, self.block_timeout
+        ) and not self._stopping
+
+    def _ensure_thread(self):
+        """持锁调用，写入线程未运行时启动"""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        """写入线程主循环"""
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: (self._batch_ready() or self._stopping
+                             or (self._flushing and self._queue)),
+                    self.flush_interval
+                )
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                self._writing = len(batch)
+                stopping = self._stopping
+                # 腾出空间后唤醒 block 策略下等待的请求线程
+                self._cond.notify_all()
+            if batch:
+                self._write(batch)
+            with self._cond:
+                self._writing = 0
+                self._cond.notify_all()
+                if stopping and not self._queue:
+                    return
+
+    def _write(self, batch):
+        """按模型分组 bulk_create，批量写入出现数据库错误时逐条写入，只有写入失败的记录计入 failed"""
+        start = time.perf_counter()
+        groups = {}
+        for record in batch:
+            groups.setdefault(type(record), []).append(record)
+        close_old_connections()
+        for model, records in groups.items():
+            try:
+                model.objects.bulk_create(records)
+                written = len(records)
+            except DatabaseError as e:
+                # 一条记录违反约束或超长会使整批失败，逐条写入保留其余记录
+                print(f"批量写入{model.__name__}失败，改为逐条写入: {str(e)}")
+                written = self._write_each(records)
+            except Exception as e:
+                written = 0
+                print(f"批量写入{model.__name__}失败: {str(e)}")
+            with self._cond:
+                self.written += written
+                self.failed += len(records) - written
+        with self._cond:
+            self.batches += 1
+            self.last_flush_ms = round((time.perf_counter() - start) * 1000, 2)
+
+    def _write_each(self, records):
+        """逐条写入，返回写入成功的记录数"""
+        written = 0
+        for record in records:
+            try:
+                record.save(force_insert=True)
+                written += 1
+            except Exception as e:
+                print(f"写入{type(record).__name__}失败: {str(e)}")
+        return written
+
+    def flush(self, timeout=5.0):
+        """
+        立即写入队列中的记录，等待写入完成
+
+        Returns:
+            bool: 超时前是否已全部写入
+        """
+        self._check_pid()
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                return not self._queue
+            self._flushing += 1
+            self._cond.notify_all()
+            try:
+                return self._cond.wait_for(lambda: not self._queue and not self._writing, timeout)
+            finally:
+                self._flushing -= 1
+
+    def stop(self, timeout=5.0):
+        """停止接收新记录，写入剩余记录后结束写入线程（进程退出时自动调用）"""
+        self._check_pid()
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None and thread.is_alive():
+            thread.join(timeout)
+
+    def stats(self):
+        """写入统计"""
+        self._check_pid()
+        with self._cond:
+            return {
+                'enabled': self.enabled,
+                'policy': self.policy,
+                'queue_depth': len(self._queue),
+                'max_queue': self.max_queue,
+                'max_depth': self.max_depth,
+                'enqueued': self.enqueued,
+                'written': self.written,
+                'dropped': self.dropped,
+                'failed': self.failed,
+                'batches': self.batches,
+                'last_flush_ms': self.last_flush_ms,
+            }
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_log_writer():
+    """获取进程内共享的日志写入器，配置取自 settings.LOG_WRITER"""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                from django.conf import settings
+                _writer = BatchLogWriter(**getattr(settings, 'LOG_WRITER', {}))
+                atexit.register(_writer.stop)
+    return _writer
@@ -15,8 +15,9 @@ from rest_framework.response import Response
 from rest_framework import status
 
 from utils.rsa_handler import decrypt_password, PUBLIC_KEY
-from utils.auth import generate_token, token_required
+from utils.auth import generate_token, token_required, admin_required
 from .models import User, Admin, UserLog, SystemLog, UserBug
+from .log_writer import get_log_writer
 
 logger = logging.getLogger('accounts')
 
@@ -342,10 +343,27 @@ def get_system_logs(request):
         ]
     })
 
+# 日志写入器状态
+@csrf_exempt
+@admin_required
+@require_http_methods(['GET', 'POST'])
+def log_writer_status(request):
+    """
+    日志批量写入器状态
+    GET 返回队列深度、已写入、丢弃和失败计数，POST 立即写入队列中的日志
+    """
+    writer = get_log_writer()
+    if request.method == 'POST':
+        flushed = writer.flush()
+        return JsonResponse({'success': flushed, 'data': writer.stats()})
+    return JsonResponse({'success': True, 'data': writer.stats()})
+
 # 用于记录系统日志的函数
 def log_system_event(level, module, message, trace=None):
+    # 记录放入后台写入队列，由写入线程批量写入数据库
     try:
-        SystemLog.objects.create(
+        get_log_writer().submit(
+            SystemLog,
             level=level,
             module=module,
             message=message,
@@ -0,0 +1,17 @@
+"""
+gunicorn 配置
+用法: gunicorn -c gunicorn.conf.py medkg_backend.wsgi:application
+"""
+import os
+import multiprocessing
+
+bind = os.environ.get('MEDKG_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('MEDKG_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+timeout = 60
+
+
+def on_starting(server):
+    """主进程启动时预加载问题分类器，worker通过写时复制共享自动机和词表"""
+    from nlp_module.question_classifier import preload_classifier
+    preload_classifier()
+    server.log.info("问题分类器已在主进程预加载")
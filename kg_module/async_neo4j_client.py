@@ -0,0 +1,242 @@
+# kg_module/async_neo4j_client.py
+
+import time
+import asyncio
+import weakref
+
+from neo4j import AsyncGraphDatabase
+
+from .neo4j_client import Neo4jClient, get_client
+from .query_profiler import QueryProfiler
+from .entity_cache import create_entity_cache
+
+class AsyncNeo4jClient:
+    """
+    基于 neo4j 异步驱动的客户端，供 ASGI 部署下的异步视图使用
+
+    等待 Bolt 响应时不占用线程，一个进程可同时处理大量在途问题；
+    结果格式与 Neo4jClient.execute_query_set 一致。
+    查询统计和实体级缓存与同步客户端共用，查询统计、实体缓存管理接口同时反映两条路径。
+    """
+
+    def __init__(self, uri, user, password, max_connection_pool_size=100,
+                 connection_acquisition_timeout=60, max_connection_lifetime=3600,
+                 query_parallelism=4, fetch_size=1000, sync_client=None, profiling=None, entity_cache=None,
+                 **kwargs):
+        # 连接池参数与同步客户端相同，连接池大小即进程内并发查询上限；
+        # query_parallelism 为单个问题同时执行的查询数上限，其余同步客户端参数忽略；
+        # sync_client：共用其查询统计和实体级缓存，未传入时按 profiling、entity_cache 配置单独创建
+        self.query_parallelism = max(1, query_parallelism)
+        self.fetch_size = fetch_size
+        if sync_client is not None:
+            self.profiler = sync_client.profiler
+            self.entity_cache = sync_client.entity_cache
+        else:
+            self.profiler = QueryProfiler(**profiling) if profiling else QueryProfiler(enabled=False)
+            self.entity_cache = create_entity_cache(entity_cache)
+        self._driver = AsyncGraphDatabase.driver(
+            uri, auth=(user, password),
+            max_connection_pool_size=max_connection_pool_size,
+            connection_acquisition_timeout=connection_acquisition_timeout,
+            max_connection_lifetime=max_connection_lifetime
+        )
+
+    async def close(self):
+        """关闭异步驱动"""
+        await self._driver.close()
+
+    async def execute_query(self, query, parameters=None):
+        """执行单个Cypher查询"""
+        text, key = self.profiler.prepare(query)
+        start = time.perf_counter()
+        async with self._driver.session() as session:
+            try:
+                result = await session.run(text, parameters or {})
+                data = await result.data()
+            except Exception as e:
+                await self._record_profile(key, query, parameters, start, 0, error=e)
+                raise
+            await self._record_profile(key, query, parameters, start, len(data), result)
+            return data
+
+    async def _record_profile(self, key, cypher, params, start, rows, result=None, error=None):
+        """记录查询性能统计，服务端耗时和 PROFILE 计划取自结果摘要"""
+        if key is None:
+            return
+        summary = None
+        if result is not None:
+            try:
+                summary = await result.consume()
+            except Exception:
+                summary = None
+        self.profiler.record(
+            key, cypher, params, time.perf_counter() - start, rows, summary,
+            str(error) if error is not None else None
+        )
+
+    async def execute_query_set(self, query_set, deadline=None, failures=None):
+        """
+        并发执行查询集合，结果按查询顺序合并
+
+        单条查询失败只影响该查询自身的结果；传入 QueryDeadline 时超出预算的查询被中止，
+        所属问题类型记入 deadline.late；未完整执行的查询所属问题类型追加到 failures。
+        启用实体级缓存时与同步客户端相同：命中的 (问题类型, 实体) 不再查询，
+        查询组的全部语句都成功执行后结果写入缓存。
+        """
+        cache = self.entity_cache
+        stamp = cache.stamp() if cache is not None else None
+        slots = [self._lookup_cached(query_group) if cache is not None else ([], query_group)
+                 for query_group in query_set]
+
+        semaphore = asyncio.Semaphore(self.query_parallelism)
+        tasks = [
+            (slot, self._run_task(
+                semaphore, cypher, query_group.get('params') or {}, query_group.get('fusion'),
+                query_group.get('fused_types') or [query_group.get('question_type')], deadline, failures
+            ))
+            for slot, (_, query_group) in enumerate(slots) if query_group is not None
+            for cypher in query_group.get('sql', [])
+        ]
+        outcomes = await asyncio.gather(*(task for _, task in tasks))
+        by_slot = {}
+        for (slot, _), outcome in zip(tasks, outcomes):
+            by_slot.setdefault(slot, []).append(outcome)
+
+        results = []
+        for slot, (hits, query_group) in enumerate(slots):
+            results.extend(hits)
+            collected = []
+            complete = True
+            for rows, ok in by_slot.get(slot, ()):
+                collected.extend(rows)
+                complete = complete and ok
+            results.extend(row for _, row in collected)
+            if query_group is not None and complete and cache is not None:
+                self._store_cached(query_group, collected, stamp)
+        return results
+
+    async def _run_task(self, semaphore, cypher, params, fusion, question_types, deadline=None, failures=None):
+        """
+        在独立会话中流式执行单条查询
+
+        Returns:
+            tuple: ([(问题类型, 格式化后的结果)], 是否完整执行)，失败或超时时结果为空
+        """
+        async with semaphore:
+            query, key = self.profiler.prepare(cypher)
+            if deadline is not None:
+                query = deadline.bind(query)
+                if query is None:
+                    deadline.mark_late(question_types)
+                    if failures is not None:
+                        failures.extend(question_types)
+                    return [], False
+            start = time.perf_counter()
+            try:
+                fetch = self._fetch(query, params, fusion, question_types)
+                if deadline is None:
+                    rows, result = await fetch
+                else:
+                    # 服务端事务超时之外，客户端同样不再等待超出预算的查询
+                    rows, result = await asyncio.wait_for(fetch, max(deadline.remaining(), 0))
+            except Exception as e:
+                await self._record_profile(key, cypher, params, start, 0, error=e)
+                if deadline is not None and (isinstance(e, asyncio.TimeoutError) or deadline.is_timeout(e)):
+                    deadline.mark_late(question_types)
+                if failures is not None:
+                    failures.extend(question_types)
+                print(f"执行查询失败: {cypher} 参数: {params}\n错误信息: {str(e)}")
+                return [], False
+            await self._record_profile(key, cypher, params, start, len(rows), result)
+            return rows, True
+
+    async def _fetch(self, query, params, fusion, question_types):
+        """执行查询并格式化结果，返回 ([(问题类型, 结果行)], 结果对象)"""
+        async with self._driver.session(fetch_size=self.fetch_size) as session:
+            result = await session.run(query, params)
+            if fusion:
+                # 融合查询每个锚点实体只有一条记录，取回后再拆分
+                parts = self._split_fused_parts([record async for record in result], fusion)
+                rows = [(question_type, self._format_anchored(record, params)) for question_type, record in parts]
+            else:
+                rows = [(question_types[0], self._format_anchored(record, params)) async for record in result]
+            # 会话关闭前取结果摘要，用于查询统计
+            summary = await result.consume() if self.profiler.enabled else None
+            return rows, _ConsumedResult(summary)
+
+    # 融合查询拆分、结果格式化和实体级缓存读写与同步客户端共用
+    _split_fused = Neo4jClient._split_fused
+    _split_fused_parts = Neo4jClient._split_fused_parts
+    _format_results = Neo4jClient._format_results
+    _format_record = Neo4jClient._format_record
+    _format_anchored = Neo4jClient._format_anchored
+    _lookup_cached = Neo4jClient._lookup_cached
+    _store_cached = Neo4jClient._store_cached
+
+
+class _ConsumedResult:
+    """会话关闭后保留的结果摘要，供 _record_profile 读取"""
+
+    def __init__(self, summary):
+        self._summary = summary
+
+    async def consume(self):
+        return self._summary
+
+
+class SyncClientAdapter:
+    """
+    以异步接口包装共享的同步客户端，查询在线程池中执行
+
+    record / replay 后端只有同步实现，异步视图经由该适配器使用同一个客户端，
+    不会绕过夹具直接访问真实数据库。
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    async def close(self):
+        """共享的同步客户端在进程退出时统一关闭"""
+
+    async def execute_query(self, query, parameters=None):
+        return await asyncio.to_thread(self.client.execute_query, query, parameters)
+
+    async def execute_query_set(self, query_set, deadline=None, failures=None):
+        return await asyncio.to_thread(self.client.execute_query_set, query_set, deadline, failures)
+
+
+# 异步驱动绑定创建它的事件循环：事件循环 -> {(uri, 用户名, 后端模式): 客户端}
+# 以弱引用为键，事件循环销毁后对应客户端随之释放。
+# 异步驱动只应在 ASGI 部署下长期运行的事件循环中使用，WSGI 下每个请求一个事件循环，
+# 连接池无法复用，异步视图在 WSGI 下改走同步客户端
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_client(config=None, backend=None):
+    """
+    获取当前事件循环共享的异步Neo4j客户端，首次调用时创建
+
+    Args:
+        config: 连接配置，默认使用 settings.NEO4J_CONFIG
+        backend: 后端配置，默认使用 settings.NEO4J_BACKEND；
+            live 使用异步驱动，record / replay 包装 get_client 返回的同步客户端
+    """
+    if config is None or backend is None:
+        from django.conf import settings
+        if config is None:
+            config = settings.NEO4J_CONFIG
+        if backend is None:
+            backend = getattr(settings, 'NEO4J_BACKEND', None) or {}
+    mode = backend.get('mode', 'live')
+    clients = _async_clients.setdefault(asyncio.get_running_loop(), {})
+    key = (config['uri'], config['user'], mode)
+    client = clients.get(key)
+    if client is None:
+        # 同一事件循环内没有并发创建的竞争，无需加锁
+        if mode == 'live':
+            # 与同步客户端共用查询统计和实体级缓存
+            client = AsyncNeo4jClient(sync_client=get_client(config, backend), **config)
+        else:
+            client = SyncClientAdapter(get_client(config, backend))
+        clients[key] = client
+    return client
@@ -0,0 +1,158 @@
+# kg_module/entity_cache.py
+
+"""
+实体级查询结果缓存
+不同问题常落在相同的热点实体上（"高血压的症状"、"高血压吃什么药"都以高血压为锚点），
+按 (问题类型, 实体) 缓存格式化后的结果行，任意问题再次用到同一组合时不再访问图数据库
+"""
+import threading
+from collections import OrderedDict
+
+from nlp_module.question_cache import estimate_size
+
+
+class EntityCache:
+    """
+    线程安全的LRU缓存，按条目数和估算字节数限制大小
+
+    stamp() 返回当前缓存代数，set() 时代数已变化则丢弃，
+    避免清除之前开始执行的查询在清除之后写回旧结果。
+    配置了知识图谱版本号时，stamp() 发现版本变化即清空缓存，其他进程的写入同样生效。
+    """
+
+    def __init__(self, max_entries=50000, max_bytes=32 * 1024 * 1024, version=None):
+        """
+        Args:
+            max_entries: 最大条目数
+            max_bytes: 最大字节数（估算值）
+            version: 可选，返回当前知识图谱版本号的函数
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._version_source = version
+        self._version = version() if version is not None else None
+        self._data = OrderedDict()  # (问题类型, 实体) -> (结果行, 字节数)
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+        self.purged = 0
+        self.invalidations = 0
+
+    def stamp(self):
+        """执行查询前调用，返回写入时使用的缓存代数"""
+        version = self._version_source() if self._version_source is not None else None
+        with self._lock:
+            if version != self._version:
+                self._version = version
+                self._clear()
+                self.invalidations += 1
+            return self._generation
+
+    def get(self, question_type, entity):
+        """读取缓存的结果行，未命中返回None"""
+        key = (question_type, entity)
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, question_type, entity, rows, stamp):
+        """写入结果行，缓存代数已变化或单条超过字节上限时丢弃"""
+        key = (question_type, entity)
+        size = estimate_size(key) + estimate_size(rows)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if stamp != self._generation:
+                return
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (rows, size)
+            self.current_bytes += size
+            while len(self._data) > self.max_entries or self.current_bytes > self.max_bytes:
+                self.evicted_bytes += self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def purge(self, entity=None, question_type=None):
+        """
+        清除缓存条目，实体更新后调用
+
+        Args:
+            entity: 只清除该实体的条目
+            question_type: 只清除该问题类型的条目
+            两者都不传时清空全部
+
+        Returns:
+            int: 清除的条目数
+        """
+        with self._lock:
+            if entity is None and question_type is None:
+                count = len(self._data)
+                self._clear()
+            else:
+                keys = [
+                    key for key in self._data
+                    if (entity is None or key[1] == entity) and (question_type is None or key[0] == question_type)
+                ]
+                for key in keys:
+                    self._remove(key)
+                count = len(keys)
+                self._generation += 1
+            self.purged += count
+            return count
+
+    def _remove(self, key):
+        _, size = self._data.pop(key)
+        self.current_bytes -= size
+        return size
+
+    def _clear(self):
+        self._data.clear()
+        self.current_bytes = 0
+        self._generation += 1
+
+    def stats(self):
+        """缓存统计信息"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._data),
+                'bytes': self.current_bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+                'evictions': self.evictions,
+                'evicted_bytes': self.evicted_bytes,
+                'purged': self.purged,
+                'invalidations': self.invalidations,
+                'kg_version': self._version,
+            }
+
+
+def create_entity_cache(config):
+    """
+    按配置创建实体级缓存，未配置或未启用时返回None
+
+    Args:
+        config: {'enabled', 'max_entries', 'max_bytes', 'track_kg_version'}，
+            track_kg_version 为True时知识图谱版本号变化后清空缓存
+    """
+    if not config or not config.get('enabled', True):
+        return None
+    options = dict(config)
+    options.pop('enabled', None)
+    version = None
+    if options.pop('track_kg_version', True):
+        from .kg_version import get_kg_version
+        version = get_kg_version().current
+    return EntityCache(version=version, **options)
@@ -0,0 +1,77 @@
+# kg_module/kg_version.py
+
+"""
+知识图谱版本号
+每次写入知识图谱后递增，保存在版本文件中，同一台机器上的多个进程共享；
+问答结果缓存以版本号标记条目，知识图谱更新后旧条目自动失效
+"""
+import os
+import time
+import threading
+
+
+class KGVersion:
+    """基于版本文件的知识图谱版本号"""
+
+    def __init__(self, path):
+        self.path = path
+        # bump() 持锁时会调用 current()，使用可重入锁
+        self._lock = threading.RLock()
+        # 版本文件的 (inode, 修改时间, 大小)，未变化时不重新读取文件
+        self._signature = None
+        self._version = 0
+
+    def current(self):
+        """当前版本号，版本文件不存在时为0"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return 0
+        signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if signature != self._signature:
+            with self._lock:
+                try:
+                    with open(self.path, 'r', encoding='utf-8') as f:
+                        self._version = int(f.read().strip() or 0)
+                except (FileNotFoundError, ValueError):
+                    return self._version
+                self._signature = signature
+        return self._version
+
+    def bump(self):
+        """
+        递增版本号并返回新版本号
+
+        新版本号取 max(当前版本 + 1, 当前微秒时间戳)，多个进程同时写入时也不会回到已用过的版本；
+        先写临时文件再替换，读取方不会读到写了一半的文件。
+        """
+        with self._lock:
+            version = max(self.current() + 1, time.time_ns() // 1000)
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            tmp_path = f'{self.path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(str(version))
+            os.replace(tmp_path, self.path)
+            return version
+
+
+_kg_version = None
+_kg_version_lock = threading.Lock()
+
+
+def get_kg_version(path=None):
+    """
+    获取进程内共享的知识图谱版本号对象
+
+    Args:
+        path: 版本文件路径，默认使用 settings.KG_VERSION_FILE
+    """
+    global _kg_version
+    if _kg_version is None:
+        with _kg_version_lock:
+            if _kg_version is None:
+                if path is None:
+                    from django.conf import settings
+                    path = settings.KG_VERSION_FILE
+                _kg_version = KGVersion(path)
+    return _kg_version
@@ -11,22 +11,46 @@ import re
 import pandas as pd
 import json
 import csv
-from .neo4j_client import Neo4jClient
+import functools
+from .neo4j_client import get_client
+from .schema import ensure_name_indexes
+from .kg_version import get_kg_version
 from accounts.views import log_system_event
-from django.conf import settings
 import traceback
 from datetime import datetime
 
+
+def bumps_kg_version(method):
+    """
+    将方法标记为一次写入操作：操作结束时（包括失败）若执行过写入，递增一次知识图谱版本号，
+    使缓存的问答结果失效；操作内的逐条写入不再各自递增
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        self._operation_depth += 1
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self._operation_depth -= 1
+            if self._operation_depth == 0 and self._pending_writes:
+                self._pending_writes = 0
+                get_kg_version().bump()
+    return wrapper
+
+
 class KnowledgeGraphUpdater:
     """知识图谱更新器，用于爬取医疗数据并更新到知识图谱"""
     
     def __init__(self):
-        # 初始化时不创建Neo4j客户端，会在update_knowledge_graph方法中使用传入的客户端或创建新的
+        # 初始化时不获取Neo4j客户端，会在update_knowledge_graph方法中使用传入的客户端或共享客户端
         self.neo4j_client = None
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
         self.logger = logging.getLogger(__name__)
+        # 进行中的写入操作层数和操作内已执行的写入数，见 bumps_kg_version
+        self._operation_depth = 0
+        self._pending_writes = 0
     
     def crawl_medical_data(self, source_url):
         """
@@ -99,6 +123,7 @@ class KnowledgeGraphUpdater:
             log_system_event("ERROR", "KG_Updater", error_msg, trace=str(e))
             return None
     
+    @bumps_kg_version
     def update_knowledge_graph(self, search_term):
         """
         更新知识图谱，根据搜索词爬取医疗数据并添加到知识图谱
@@ -109,9 +134,9 @@ class KnowledgeGraphUpdater:
         Returns:
             dict: 更新结果统计
         """
-        # 如果没有neo4j_client，则创建一个
+        # 如果没有neo4j_client，则使用共享客户端
         if not self.neo4j_client:
-            self.neo4j_client = Neo4jClient(**settings.NEO4J_CONFIG)
+            self.neo4j_client = get_client()
             
         start_time = datetime.now()
         print(f"[{start_time}] 开始更新知识图谱，搜索关键词: {search_term}")
@@ -211,6 +236,7 @@ class KnowledgeGraphUpdater:
         
         return result
         
+    @bumps_kg_version
     def process_json_file(self, file_path):
         """
         处理JSON格式的文件，更新知识图谱
@@ -224,7 +250,9 @@ class KnowledgeGraphUpdater:
         try:
             # 确保neo4j_client已初始化
             if not self.neo4j_client:
-                self.neo4j_client = Neo4jClient(**settings.NEO4J_CONFIG)
+                self.neo4j_client = get_client()
+            # 批量导入前确保 name 查找有索引可用
+            self._ensure_schema()
                 
             start_time = datetime.now()
             print(f"[{start_time}] 开始处理JSON文件: {file_path}")
@@ -300,6 +328,7 @@ class KnowledgeGraphUpdater:
                 'relations_added': 0
             }
     
+    @bumps_kg_version
     def process_csv_file(self, file_path):
         """
         处理CSV格式的文件，更新知识图谱
@@ -313,7 +342,9 @@ class KnowledgeGraphUpdater:
         try:
             # 确保neo4j_client已初始化
             if not self.neo4j_client:
-                self.neo4j_client = Neo4jClient(**settings.NEO4J_CONFIG)
+                self.neo4j_client = get_client()
+            # 批量导入前确保 name 查找有索引可用
+            self._ensure_schema()
                 
             start_time = datetime.now()
             print(f"[{start_time}] 开始处理CSV文件: {file_path}")
@@ -403,6 +434,7 @@ class KnowledgeGraphUpdater:
                 'relations_added': 0
             }
     
+    @bumps_kg_version
     def process_txt_file(self, file_path):
         """
         处理TXT格式的文件，更新知识图谱
@@ -416,7 +448,9 @@ class KnowledgeGraphUpdater:
         try:
             # 确保neo4j_client已初始化
             if not self.neo4j_client:
-                self.neo4j_client = Neo4jClient(**settings.NEO4J_CONFIG)
+                self.neo4j_client = get_client()
+            # 批量导入前确保 name 查找有索引可用
+            self._ensure_schema()
                 
             start_time = datetime.now()
             print(f"[{start_time}] 开始处理TXT文件: {file_path}")
@@ -487,6 +521,28 @@ class KnowledgeGraphUpdater:
                 'relations_added': 0
             }
     
+    def _ensure_schema(self):
+        """
+        确保已知标签的 name 属性已建立范围索引（不建立唯一约束，不影响重名节点的导入）
+        导入时 MERGE/MATCH 都按 name 查找节点，没有索引时每次都是全标签扫描；失败不影响导入
+        """
+        try:
+            actions = ensure_name_indexes(self.neo4j_client)
+            created = [label for label, action in actions if action != 'exists']
+            if created:
+                print(f"已为以下标签建立 name 索引: {', '.join(created)}")
+        except Exception as e:
+            print(f"建立知识图谱索引失败: {str(e)}")
+    
+    @bumps_kg_version
+    def _write(self, query, params):
+        """
+        执行写入查询，所在的写入操作结束后递增一次知识图谱版本号；
+        写入失败时同样计入，事务可能已部分提交
+        """
+        self._pending_writes += 1
+        return self.neo4j_client.execute_query(query, params)
+    
     def _create_entity(self, entity_type, entity_name, properties):
         """
         创建实体节点
@@ -508,7 +564,7 @@ class KnowledgeGraphUpdater:
         """
         
         # 执行查询
-        self.neo4j_client.execute_query(query, {
+        self._write(query, {
             'name': entity_name,
             'properties': props
         })
@@ -532,7 +588,7 @@ class KnowledgeGraphUpdater:
         """
         
         # 执行查询
-        self.neo4j_client.execute_query(query, {
+        self._write(query, {
             'source_name': source_name,
             'target_name': target_name
         }) 
\ No newline at end of file
@@ -1,48 +1,431 @@
 # kg_module/neo4j_client.py
 
-from neo4j import GraphDatabase
+import os
+import time
+import atexit
+import threading
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from neo4j import GraphDatabase, Query
+
+from .query_profiler import QueryProfiler
+from .entity_cache import create_entity_cache
+
+class QueryDeadline:
+    """
+    单次请求的查询时间预算
+
+    剩余时间作为事务超时传给每条查询，预算耗尽后未执行或被中止的查询
+    所属的问题类型记入 late，由调用方标记为部分结果。
+    """
+
+    def __init__(self, budget):
+        """
+        Args:
+            budget: 时间预算（秒），从创建时开始计时
+        """
+        self.budget = budget
+        self.expires_at = time.monotonic() + budget
+        self.late = []
+        # 并发执行时多个查询线程会同时记录
+        self._lock = threading.Lock()
+
+    def remaining(self):
+        """剩余时间（秒），可能为负"""
+        return self.expires_at - time.monotonic()
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def mark_late(self, question_types):
+        """记录超时的问题类型"""
+        with self._lock:
+            for question_type in question_types:
+                if question_type not in self.late:
+                    self.late.append(question_type)
+
+    def bind(self, cypher):
+        """以剩余时间作为事务超时包装查询，预算已耗尽时返回None"""
+        remaining = self.remaining()
+        if remaining <= 0:
+            return None
+        # 驱动按毫秒传递超时，过小的值会被视为不限时
+        return Query(cypher, timeout=max(remaining, 0.001))
+
+    def is_timeout(self, error):
+        """判断查询异常是否由超时引起"""
+        return 'TransactionTimedOut' in (getattr(error, 'code', None) or '') or self.expired()
+
 
 class Neo4jClient:
-    def __init__(self, uri, user, password):
+    def __init__(self, uri, user, password, max_connection_pool_size=100,
+                 connection_acquisition_timeout=60, max_connection_lifetime=3600,
+                 query_workers=0, query_parallelism=4, fetch_size=1000, profiling=None, entity_cache=None):
         # 初始化Neo4j客户端，连接到指定的Neo4j数据库
+        # 连接池参数：最大连接数、获取连接的等待超时（秒）、连接最长存活时间（秒）
+        # 并发查询参数：全局查询线程数（0 表示串行执行）、单个问题同时执行的查询数上限
+        # fetch_size：流式读取结果时每批从服务端拉取的记录数
+        # profiling：查询性能统计配置（QueryProfiler 参数），未配置时不统计
+        # entity_cache：实体级结果缓存配置（见 create_entity_cache），未配置时不缓存
+        self.profiler = QueryProfiler(**profiling) if profiling else QueryProfiler(enabled=False)
+        self.entity_cache = create_entity_cache(entity_cache)
+        self.fetch_size = fetch_size
+        self.query_workers = query_workers
+        self.query_parallelism = max(1, query_parallelism)
+        self._executor = None
+        self._executor_lock = threading.Lock()
         try:
-            self._driver = GraphDatabase.driver(uri, auth=(user, password))
-            # 验证连接是否成功
-            with self._driver.session() as session:
-                result = session.run("RETURN 1")
-                if result.single().value() == 1:
-                    print("Connected to Neo4j database at", uri)
+            self._driver = self._create_driver(
+                uri, user, password,
+                max_connection_pool_size=max_connection_pool_size,
+                connection_acquisition_timeout=connection_acquisition_timeout,
+                max_connection_lifetime=max_connection_lifetime
+            )
         except Exception as e:
             # 如果连接失败，打印错误信息并抛出异常
             print("Failed to connect to Neo4j database at", uri)
             raise Exception("Neo4j连接失败: ", e)
 
+    def _create_driver(self, uri, user, password, **pool_options):
+        """创建驱动并验证连接，录制/回放客户端覆盖此方法替换驱动"""
+        driver = GraphDatabase.driver(uri, auth=(user, password), **pool_options)
+        # 验证连接是否成功
+        with driver.session() as session:
+            result = session.run("RETURN 1")
+            if result.single().value() == 1:
+                print("Connected to Neo4j database at", uri)
+        return driver
+
 
     def close(self):
         # 关闭Neo4j客户端连接，释放资源，打印出来提示信息
         print("Closing Neo4j database connection...")
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
         self._driver.close()
         print("Connection closed.")
 
     def execute_query(self, query, parameters=None):
         """执行单个Cypher查询"""
+        text, key = self.profiler.prepare(query)
+        start = time.perf_counter()
         with self._driver.session() as session:
-            result = session.run(query, parameters or {})
-            return result.data()
+            try:
+                result = session.run(text, parameters or {})
+                data = result.data()
+            except Exception as e:
+                self._record_profile(key, query, parameters, start, 0, error=e)
+                raise
+            self._record_profile(key, query, parameters, start, len(data), result)
+            return data
 
-    def execute_query_set(self, query_set):
-        """执行查询集合"""
-        results = []
-        with self._driver.session() as session:
-            for query_group in query_set:
-                for cypher in query_group.get('sql', []):
+    def iter_query(self, query, parameters=None):
+        """流式执行单个Cypher查询，按 fetch_size 分批拉取，逐条返回记录字典"""
+        text, key = self.profiler.prepare(query)
+        start = time.perf_counter()
+        rows = 0
+        with self._driver.session(fetch_size=self.fetch_size) as session:
+            try:
+                result = session.run(text, parameters or {})
+                for record in result:
+                    rows += 1
+                    yield record.data()
+            except Exception as e:
+                self._record_profile(key, query, parameters, start, rows, error=e)
+                raise
+            self._record_profile(key, query, parameters, start, rows, result)
+
+    def _record_profile(self, key, cypher, params, start, rows, result=None, error=None):
+        """记录查询性能统计，服务端耗时和 PROFILE 计划取自结果摘要"""
+        if key is None:
+            return
+        summary = None
+        if result is not None:
+            try:
+                summary = result.consume()
+            except Exception:
+                summary = None
+        self.profiler.record(
+            key, cypher, params, time.perf_counter() - start, rows, summary,
+            str(error) if error is not None else None
+        )
+
+    def execute_query_set(self, query_set, deadline=None, failures=None):
+        """
+        执行查询集合
+
+        配置了 query_workers 且查询多于一条时并发执行，结果仍按查询顺序合并；
+        单条查询失败只影响该查询自身的结果。
+        """
+        return list(self.iter_query_set(query_set, deadline, failures))
+
+    def iter_query_set(self, query_set, deadline=None, failures=None):
+        """
+        流式执行查询集合，逐条返回格式化后的结果
+
+        串行执行时直接从游标读取记录并格式化，不经过 .data() 的中间副本，
+        服务端结果按 fetch_size 分批拉取，单次请求的内存占用与结果总数无关。
+        启用实体级缓存时，已缓存的 (问题类型, 实体) 直接返回缓存结果，不再查询；
+        查询组的全部语句都成功执行后，结果按 (问题类型, 实体) 写入缓存。
+
+        Args:
+            query_set: 查询组列表
+            deadline: 可选，QueryDeadline，超出预算的查询被跳过或中止，所属问题类型记入 deadline.late
+            failures: 可选，列表，未完整执行（失败、超时或被跳过）的查询所属问题类型追加到其中，
+                调用方据此判断结果是否完整，例如不缓存不完整的问答结果
+        """
+        cache = self.entity_cache
+        stamp = cache.stamp() if cache is not None else None
+        # 每个查询组：(缓存命中的结果行, 仍需执行的查询组，全部命中时为None)
+        slots = [self._lookup_cached(query_group) if cache is not None else ([], query_group)
+                 for query_group in query_set]
+
+        # 查询文本固定，实体等取值通过参数传入，便于Neo4j复用执行计划
+        tasks = [
+            (slot, (cypher, query_group.get('params') or {}, query_group.get('fusion'),
+                    query_group.get('fused_types') or [query_group.get('question_type')]))
+            for slot, (_, query_group) in enumerate(slots) if query_group is not None
+            for cypher in query_group.get('sql', [])
+        ]
+        if self.query_workers > 0 and len(tasks) > 1:
+            results = iter(self._run_concurrent([task for _, task in tasks], deadline))
+        else:
+            results = None
+
+        # 全部命中缓存或并发执行时不需要当前线程的会话
+        if results is None and tasks:
+            session_context = self._driver.session(fetch_size=self.fetch_size)
+        else:
+            session_context = nullcontext()
+        with session_context as session:
+            task_index = 0
+            for slot, (hits, query_group) in enumerate(slots):
+                yield from hits
+                collected = [] if cache is not None else None
+                complete = True
+                while task_index < len(tasks) and tasks[task_index][0] == slot:
+                    task = tasks[task_index][1]
+                    task_index += 1
+                    if results is None:
+                        ok = yield from self._emit(self._iter_task(session, *task, deadline), collected)
+                    else:
+                        rows, ok = next(results)
+                        yield from self._emit(iter(rows), collected)
+                    complete = complete and ok
+                    if not ok and failures is not None:
+                        failures.extend(task[3])
+                if query_group is not None and complete and collected is not None:
+                    self._store_cached(query_group, collected, stamp)
+
+    @staticmethod
+    def _emit(task_rows, collected):
+        """输出任务的结果行，需要写入缓存时同时收集 (问题类型, 结果行)；返回任务是否成功执行"""
+        while True:
+            try:
+                question_type, row = next(task_rows)
+            except StopIteration as stop:
+                return stop.value if stop.value is not None else True
+            if collected is not None:
+                collected.append((question_type, row))
+            yield row
+
+    def _lookup_cached(self, query_group):
+        """
+        查找查询组涉及的 (问题类型, 实体) 缓存
+
+        批量查询组只执行未命中的实体；融合查询组全部问题类型命中时才跳过，否则整体执行。
+        缓存的结果行不带查询实体，命中时按缓存键中的实体补上 query_entity。
+
+        Returns:
+            tuple: (命中的结果行, 仍需执行的查询组或None)
+        """
+        cache = self.entity_cache
+        params = query_group.get('params') or {}
+        question_type = query_group.get('question_type')
+        if 'names' in params:
+            hits = []
+            missing = []
+            for name in params['names']:
+                rows = cache.get(question_type, name)
+                if rows is None:
+                    missing.append(name)
+                else:
+                    # 批量查询结果带有所属的查询实体
+                    hits.extend(dict(row, query_entity=name) for row in rows)
+            if not missing:
+                return hits, None
+            if len(missing) == len(params['names']):
+                return [], query_group
+            return hits, dict(query_group, params=dict(params, names=missing))
+
+        name = params.get('name')
+        if name is None:
+            return [], query_group
+        cached = []
+        for group_type in query_group.get('fused_types') or [question_type]:
+            rows = cache.get(group_type, name)
+            if rows is None:
+                return [], query_group
+            cached.extend(dict(row, query_entity=name) for row in rows)
+        return cached, None
+
+    def _store_cached(self, query_group, collected, stamp):
+        """
+        将查询组的结果按 (问题类型, 实体) 写入缓存，没有结果的组合缓存为空列表
+
+        查询实体由缓存键决定，写入的结果行去掉 query_entity，单实体和批量查询的缓存条目格式一致
+        """
+        cache = self.entity_cache
+        params = query_group.get('params') or {}
+        if 'names' in params:
+            question_type = query_group.get('question_type')
+            by_entity = {name: [] for name in params['names']}
+            for _, row in collected:
+                rows = by_entity.get(row.get('query_entity'))
+                if rows is not None:
+                    rows.append({key: value for key, value in row.items() if key != 'query_entity'})
+            for name, rows in by_entity.items():
+                cache.set(question_type, name, rows, stamp)
+            return
+
+        name = params.get('name')
+        if name is None:
+            return
+        by_type = {group_type: [] for group_type in query_group.get('fused_types') or [query_group.get('question_type')]}
+        for question_type, row in collected:
+            by_type.setdefault(question_type, []).append(
+                {key: value for key, value in row.items() if key != 'query_entity'}
+            )
+        for question_type, rows in by_type.items():
+            cache.set(question_type, name, rows, stamp)
+
+    def purge_entity_cache(self, entity=None, question_type=None):
+        """
+        清除实体级缓存，直接修改图数据库中的实体后调用；不传参数时清空全部
+
+        Returns:
+            int: 清除的条目数
+        """
+        if self.entity_cache is None:
+            return 0
+        return self.entity_cache.purge(entity, question_type)
+
+    def _iter_task(self, session, cypher, params, fusion, question_types, deadline=None):
+        """
+        在给定会话中流式执行单条查询，逐条返回 (问题类型, 格式化后的结果)
+
+        失败时停止该查询的输出；生成器返回值表示查询是否完整执行。
+        """
+        query, key = self.profiler.prepare(cypher)
+        if deadline is not None:
+            query = deadline.bind(query)
+            if query is None:
+                deadline.mark_late(question_types)
+                return False
+        start = time.perf_counter()
+        rows = 0
+        try:
+            result = session.run(query, params)
+            if fusion:
+                records = self._split_fused_parts(result, fusion)
+            else:
+                records = ((question_types[0], record) for record in result)
+            for question_type, record in records:
+                rows += 1
+                yield question_type, self._format_anchored(record, params)
+            self._record_profile(key, cypher, params, start, rows, result)
+            return True
+        except Exception as e:
+            self._record_profile(key, cypher, params, start, rows, error=e)
+            if deadline is not None and deadline.is_timeout(e):
+                deadline.mark_late(question_types)
+            print(f"执行查询失败: {cypher} 参数: {params}\n错误信息: {str(e)}")
+            return False
+
+    def _run_isolated(self, cypher, params, fusion, question_types, deadline=None):
+        """
+        在独立会话中执行单条查询（会话不能跨线程共享）
+
+        Returns:
+            tuple: ([(问题类型, 格式化后的结果)], 是否完整执行)
+        """
+        try:
+            with self._driver.session(fetch_size=self.fetch_size) as session:
+                task = self._iter_task(session, cypher, params, fusion, question_types, deadline)
+                rows = []
+                while True:
                     try:
-                        result = session.run(cypher).data()
-                        results.extend(result)
-                    except Exception as e:
-                        print(f"执行查询失败: {cypher}\n错误信息: {str(e)}")
-                        continue
-        return self._format_results(results)
+                        rows.append(next(task))
+                    except StopIteration as stop:
+                        return rows, stop.value
+        except Exception as e:
+            print(f"执行查询失败: {cypher} 参数: {params}\n错误信息: {str(e)}")
+            return [], False
+
+    def _get_executor(self):
+        """全局查询线程池，线程数即整个进程的并发查询上限"""
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.query_workers, thread_name_prefix='neo4j-query'
+                    )
+        return self._executor
+
+    def _run_concurrent(self, tasks, deadline=None):
+        """
+        并发执行查询，返回与 tasks 顺序一致的 (结果列表, 是否完整执行) 列表
+
+        单个问题同时在途的查询不超过 query_parallelism 条，避免一个问题占满线程池。
+        预算耗尽时不再等待在途查询（服务端会按事务超时中止），其结果记为空。
+        """
+        executor = self._get_executor()
+        results = [([], False) for _ in tasks]
+        pending = {}
+        next_index = 0
+        while next_index < len(tasks) or pending:
+            while next_index < len(tasks) and len(pending) < self.query_parallelism:
+                future = executor.submit(self._run_isolated, *tasks[next_index], deadline)
+                pending[future] = next_index
+                next_index += 1
+            timeout = max(deadline.remaining(), 0) if deadline is not None else None
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[pending.pop(future)] = future.result()
+            if not done and deadline is not None and deadline.expired():
+                for future, index in pending.items():
+                    future.cancel()
+                    deadline.mark_late(tasks[index][3])
+                for task in tasks[next_index:]:
+                    deadline.mark_late(task[3])
+                break
+        return results
+
+    def get_entity_degree(self, name, entity_types=None):
+        """
+        获取指定名称节点的关系数量（度数）
+
+        Args:
+            name: 节点名称
+            entity_types: 实体类型（如 ('disease', 'symptom')），按对应标签逐个查询以使用标签上的name索引，
+                取最大度数；为空时不限标签（全图扫描，仅用于兼容）
+        """
+        if not entity_types:
+            query = "MATCH (n {name: $name}) RETURN size([(n)--() | 1]) AS degree ORDER BY degree DESC LIMIT 1"
+            records = self.execute_query(query, {"name": name})
+            return records[0]['degree'] if records else 0
+
+        degree = 0
+        for entity_type in entity_types:
+            label = entity_type.capitalize()
+            if not label.isidentifier():
+                raise ValueError(f"无效的实体类型: {entity_type}")
+            query = f"MATCH (n:{label} {{name: $name}}) RETURN size([(n)--() | 1]) AS degree ORDER BY degree DESC LIMIT 1"
+            records = self.execute_query(query, {"name": name})
+            if records:
+                degree = max(degree, records[0]['degree'])
+        return degree
 
     def create_entity(self, label, properties):
         """创建实体节点"""
@@ -66,38 +449,125 @@ class Neo4jClient:
             "rel_props": rel_props or {}
         })
 
+    def _split_fused(self, records, plan):
+        """将融合查询的结果按拆分计划逐行还原为各问题类型单独查询时的行格式"""
+        for _, row in self._split_fused_parts(records, plan):
+            yield row
+
+    def _split_fused_parts(self, records, plan):
+        """同 _split_fused，逐行返回 (所属问题类型, 行)"""
+        for record in records:
+            anchor = record['anchor']
+            for part in plan:
+                question_type = part['question_type']
+                value = record[part['column']]
+                if part['kind'] == 'property':
+                    yield question_type, {'m.name': anchor, f"m.{part['property']}": value}
+                    continue
+                for relation, target in value:
+                    # 反向关系中锚点是关系终点，主实体为关系起点
+                    if part['reverse']:
+                        yield question_type, {'m.name': target, 'r.name': relation, 'n.name': anchor}
+                    else:
+                        yield question_type, {'m.name': anchor, 'r.name': relation, 'n.name': target}
+
     def _format_results(self, raw_data):
         """统一格式化查询结果
         返回结构：
         {
             'main_entity': 主实体名称,
             'relations': 关系数据列表,
-            'properties': 实体属性字典
+            'properties': 实体属性字典,
+            'query_entity': 结果所属的查询实体（经 _format_anchored 格式化时返回）
         }
         """
-        formatted = []
-        for item in raw_data:
-            # 提取主实体名称（m开头的节点）
-            main_entity = item.get('m.name', '') or item.get('name', '')
-
-            # 动态收集所有m.开头的属性
-            properties = {
-                key.split('.')[1]: value
-                for key, value in item.items()
-                if key.startswith('m.') and key != 'm.name'
-            }
-
-            # 收集关系数据
-            relations = {
-                'source': main_entity,
-                'relation': item.get('r.name', ''),
-                'target': item.get('n.name', '')
-            } if 'r.name' in item and 'n.name' in item else None
-
-            formatted.append({
-                'main_entity': main_entity,
-                'relations': relations if relations and relations['target'] else None,
-                'properties': properties if properties else None
-            })
-
-        return formatted
+        return [self._format_record(item) for item in raw_data]
+
+    def _format_record(self, item):
+        """格式化单条结果，item 可以是字典或驱动返回的 Record"""
+        # Record 的 in 运算判断的是值，字段名统一通过 keys() 判断
+        keys = item.keys()
+
+        # 提取主实体名称（m开头的节点）
+        main_entity = item.get('m.name', '') or item.get('name', '')
+
+        # 动态收集所有m.开头的属性
+        properties = {
+            key.split('.')[1]: item[key]
+            for key in keys
+            if key.startswith('m.') and key != 'm.name'
+        }
+
+        # 收集关系数据
+        relations = {
+            'source': main_entity,
+            'relation': item.get('r.name', ''),
+            'target': item.get('n.name', '')
+        } if 'r.name' in keys and 'n.name' in keys else None
+
+        record = {
+            'main_entity': main_entity,
+            'relations': relations if relations and relations['target'] else None,
+            'properties': properties if properties else None
+        }
+        # UNWIND批量查询返回的查询实体，用于按实体归属结果
+        if 'entity' in keys:
+            record['query_entity'] = item['entity']
+        return record
+
+    def _format_anchored(self, item, params):
+        """
+        格式化单条结果并标记所属的查询实体
+
+        反向关系查询（如 symptom_disease）的主实体是关系起点而不是被查询的实体，
+        单实体查询取 $name 参数作为查询实体，批量查询取返回的 entity 列
+        """
+        record = self._format_record(item)
+        if 'query_entity' not in record and 'name' in params:
+            record['query_entity'] = params['name']
+        return record
+
+
+# 进程内共享的客户端：(进程号, uri, 用户名, 后端模式) -> Neo4jClient
+# 驱动自带连接池，各视图和知识图谱更新器复用同一个驱动，避免每次请求新建驱动和连接探测；
+# 键中包含进程号，fork 出的工作进程不会复用父进程的连接
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(config=None, backend=None):
+    """
+    获取共享的Neo4j客户端，首次调用时创建
+
+    Args:
+        config: 连接配置，默认使用 settings.NEO4J_CONFIG
+        backend: 后端配置，默认使用 settings.NEO4J_BACKEND（live / record / replay，未配置时为 live）
+    """
+    if config is None or backend is None:
+        from django.conf import settings
+        if config is None:
+            config = settings.NEO4J_CONFIG
+        if backend is None:
+            backend = getattr(settings, 'NEO4J_BACKEND', None) or {}
+    key = (os.getpid(), config['uri'], config['user'], backend.get('mode', 'live'))
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                if backend.get('mode', 'live') == 'live':
+                    client = Neo4jClient(**config)
+                else:
+                    # 录制/回放客户端只在对应模式下导入
+                    from .replay_client import create_client
+                    client = create_client(config, backend)
+                _clients[key] = client
+    return client
+
+
+@atexit.register
+def close_clients():
+    """关闭当前进程创建的共享客户端"""
+    with _clients_lock:
+        for key in [k for k in _clients if k[0] == os.getpid()]:
+            _clients.pop(key).close()
@@ -0,0 +1,192 @@
+# kg_module/query_profiler.py
+
+"""
+Cypher 查询性能统计
+按去除字面量后的查询指纹汇总执行耗时、返回行数和服务端耗时，
+记录超过阈值的慢查询，并可按需对指定查询采集 PROFILE 执行计划
+"""
+import re
+import time
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger('kg_module')
+
+_STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBER_LITERAL = re.compile(r'(?<![\w$.])-?\d+(?:\.\d+)?\b')
+_LIST_LITERAL = re.compile(r'\[\s*\?(?:\s*,\s*\?)*\s*\]')
+_WHITESPACE = re.compile(r'\s+')
+# 不能加 PROFILE 前缀的语句：索引/约束等管理语句、系统过程调用和已带前缀的语句
+_UNPROFILABLE = re.compile(r'\s*(?:(?:SHOW|CREATE|DROP|PROFILE|EXPLAIN)\b|CALL\s+db\.)', re.IGNORECASE)
+
+
+def fingerprint(cypher):
+    """
+    查询指纹：字符串和数字字面量替换为 ?，合并空白
+    例如 "MATCH (n:Disease) RETURN n LIMIT 25" -> "MATCH (n:Disease) RETURN n LIMIT ?"
+    """
+    text = _STRING_LITERAL.sub('?', cypher)
+    text = _NUMBER_LITERAL.sub('?', text)
+    text = _LIST_LITERAL.sub('?', text)
+    return _WHITESPACE.sub(' ', text).strip()
+
+
+def summarize_plan(plan):
+    """将驱动返回的 PROFILE 计划整理为 {operator, db_hits, rows, children}"""
+    if not plan:
+        return None
+    children = [summarize_plan(child) for child in plan.get('children', [])]
+    return {
+        'operator': plan.get('operatorType'),
+        'details': (plan.get('args') or {}).get('Details'),
+        'db_hits': plan.get('dbHits', 0),
+        'rows': plan.get('rows', 0),
+        'children': children,
+    }
+
+
+def total_db_hits(plan):
+    """计划树的总 db hits"""
+    if not plan:
+        return 0
+    return plan['db_hits'] + sum(total_db_hits(child) for child in plan['children'])
+
+
+class QueryProfiler:
+    """线程安全的查询统计器"""
+
+    def __init__(self, enabled=True, slow_threshold=0.5, slow_log_size=200):
+        """
+        Args:
+            enabled: 是否记录统计
+            slow_threshold: 慢查询阈值（秒）
+            slow_log_size: 慢查询日志保留条数
+        """
+        self.enabled = enabled
+        self.slow_threshold = slow_threshold
+        self._stats = {}
+        self._slow_log = deque(maxlen=slow_log_size)
+        # 待采集 PROFILE 的请求：[指纹（None 表示任意查询）, 剩余次数]
+        self._profile_requests = []
+        self._lock = threading.Lock()
+
+    def request_profile(self, target=None, count=1):
+        """
+        请求对接下来 count 次匹配的查询采集 PROFILE 执行计划
+
+        Args:
+            target: 查询指纹或查询文本，为空时匹配任意查询
+            count: 采集次数
+        """
+        with self._lock:
+            self._profile_requests.append([fingerprint(target) if target else None, count])
+
+    def prepare(self, cypher):
+        """
+        执行前调用，返回 (实际执行的查询文本, 指纹)
+        未启用统计时指纹为None；有匹配的 PROFILE 请求时查询文本加上 PROFILE 前缀，
+        管理语句（SHOW/CREATE/DROP/CALL db.*）不采集，也不消耗请求次数
+        """
+        if not self.enabled:
+            return cypher, None
+        key = fingerprint(cypher)
+        profile = False
+        if self._profile_requests and not _UNPROFILABLE.match(cypher):
+            with self._lock:
+                for request in self._profile_requests:
+                    if request[0] is None or request[0] == key:
+                        request[1] -= 1
+                        profile = True
+                        break
+                self._profile_requests = [r for r in self._profile_requests if r[1] > 0]
+        return (f'PROFILE {cypher}' if profile else cypher), key
+
+    def record(self, key, cypher, params, wall_time, rows, summary=None, error=None):
+        """
+        记录一次查询执行
+
+        Args:
+            key: 查询指纹
+            cypher: 查询文本
+            params: 查询参数
+            wall_time: 客户端耗时（秒），流式读取时包含逐条处理结果的时间
+            rows: 返回行数
+            summary: 驱动返回的 ResultSummary，用于取服务端耗时和 PROFILE 计划
+            error: 执行失败时的错误信息
+        """
+        server_ms = None
+        plan = None
+        if summary is not None:
+            available = getattr(summary, 'result_available_after', None)
+            consumed = getattr(summary, 'result_consumed_after', None)
+            if available is not None or consumed is not None:
+                server_ms = (available or 0) + (consumed or 0)
+            plan = summarize_plan(getattr(summary, 'profile', None))
+
+        with self._lock:
+            stat = self._stats.get(key)
+            if stat is None:
+                stat = self._stats[key] = {
+                    'fingerprint': key, 'count': 0, 'errors': 0, 'rows': 0,
+                    'total_time': 0.0, 'max_time': 0.0, 'server_ms': 0, 'server_count': 0,
+                    'slow': 0, 'profile': None,
+                }
+            stat['count'] += 1
+            stat['rows'] += rows
+            stat['total_time'] += wall_time
+            stat['max_time'] = max(stat['max_time'], wall_time)
+            if error is not None:
+                stat['errors'] += 1
+            if server_ms is not None:
+                stat['server_ms'] += server_ms
+                stat['server_count'] += 1
+            if plan is not None:
+                stat['profile'] = {
+                    'captured_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+                    'db_hits': total_db_hits(plan),
+                    'plan': plan,
+                }
+            slow = wall_time >= self.slow_threshold
+            if slow:
+                stat['slow'] += 1
+                self._slow_log.append({
+                    'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+                    'fingerprint': key,
+                    'query': cypher,
+                    'params': params,
+                    'wall_time': round(wall_time, 4),
+                    'server_ms': server_ms,
+                    'rows': rows,
+                    'error': error,
+                })
+        if slow:
+            logger.warning(f"慢查询 {wall_time:.3f}秒 行数 {rows}: {key}")
+
+    def snapshot(self, order_by='total_time', limit=50):
+        """按指纹汇总的统计，默认按总耗时降序"""
+        with self._lock:
+            stats = [dict(stat) for stat in self._stats.values()]
+            slow_log = list(self._slow_log)
+        for stat in stats:
+            stat['avg_time'] = round(stat['total_time'] / stat['count'], 4) if stat['count'] else 0.0
+            stat['avg_server_ms'] = (
+                round(stat['server_ms'] / stat['server_count'], 2) if stat['server_count'] else None
+            )
+            stat['total_time'] = round(stat['total_time'], 4)
+            stat['max_time'] = round(stat['max_time'], 4)
+            del stat['server_count']
+        stats.sort(key=lambda stat: stat.get(order_by) or 0, reverse=True)
+        return {
+            'enabled': self.enabled,
+            'slow_threshold': self.slow_threshold,
+            'statements': stats[:limit],
+            'slow_queries': slow_log[::-1],
+            'pending_profiles': [list(request) for request in self._profile_requests],
+        }
+
+    def reset(self):
+        """清空统计和慢查询日志"""
+        with self._lock:
+            self._stats.clear()
+            self._slow_log.clear()
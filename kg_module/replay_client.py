@@ -0,0 +1,373 @@
+# kg_module/replay_client.py
+
+"""
+Neo4j 录制/回放客户端
+录制模式把真实数据库的 (查询, 参数) -> 结果行 写入夹具文件；
+回放模式不连接数据库，按夹具文件确定性地返回结果，并可注入延迟分布，
+用于离线压测和问答链路回归测试
+"""
+import os
+import json
+import time
+import random
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from neo4j import Query
+
+from .neo4j_client import Neo4jClient
+
+FIXTURE_VERSION = 1
+
+
+def _query_text(query):
+    """取查询文本，兼容带超时的 Query 对象；PROFILE 前缀不影响夹具匹配"""
+    text = query.text if isinstance(query, Query) else query
+    return text[len('PROFILE '):] if text.startswith('PROFILE ') else text
+
+
+@contextmanager
+def _file_lock(path):
+    """跨进程的排他文件锁：POSIX 使用 fcntl.flock，Windows 使用 msvcrt.locking"""
+    with open(path, 'a+b') as lock_file:
+        if os.name == 'nt':
+            import msvcrt
+            while True:
+                lock_file.seek(0)
+                try:
+                    # LK_LOCK 重试约10秒后仍未取得锁时抛出 OSError，继续等待
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+            try:
+                yield
+            finally:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class QueryFixture:
+    """查询夹具：(查询文本, 参数) -> 结果行列表"""
+
+    def __init__(self, path):
+        self.path = path
+        self._rows = {}
+        self._lock = threading.Lock()
+        self.dirty = False
+        self._rows.update(self._read())
+
+    def _read(self):
+        """读取夹具文件中的全部条目，文件不存在时为空"""
+        rows = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') != FIXTURE_VERSION:
+                raise ValueError(f"夹具文件版本不匹配: {self.path}")
+            for entry in data.get('queries', []):
+                rows[self.key(entry['query'], entry['params'])] = entry['rows']
+        return rows
+
+    @staticmethod
+    def key(query, params):
+        return query, json.dumps(params or {}, ensure_ascii=False, sort_keys=True, default=str)
+
+    def get(self, query, params):
+        """读取结果行，未录制时返回None"""
+        return self._rows.get(self.key(query, params))
+
+    def put(self, query, params, rows):
+        with self._lock:
+            self._rows[self.key(query, params)] = rows
+            self.dirty = True
+
+    def save(self):
+        """
+        写入夹具文件
+
+        多个 worker 进程可能同时录制到同一文件：持文件锁重新读取文件，
+        合并其他进程已写入的条目（本进程的结果优先）后写入同目录下的唯一临时文件再替换，
+        不会覆盖其他进程的录制结果，也不会留下不完整的文件。
+        """
+        with self._lock:
+            own = dict(self._rows)
+            self.dirty = False
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        with _file_lock(f'{self.path}.lock'):
+            rows = self._read()
+            rows.update(own)
+            queries = [
+                {'query': query, 'params': json.loads(params), 'rows': result}
+                for (query, params), result in rows.items()
+            ]
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(self.path), suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump({'version': FIXTURE_VERSION, 'queries': queries}, f,
+                              ensure_ascii=False, indent=1, default=str)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        return len(queries)
+
+    def __len__(self):
+        return len(self._rows)
+
+
+class LatencyModel:
+    """
+    注入延迟模型
+
+    rules 为规则列表，按顺序取第一条 match 子串出现在查询文本中的规则（无 match 的规则匹配所有查询）：
+        {'match': 'has_symptom', 'distribution': 'lognormal', 'mu': -3, 'sigma': 0.8}
+        {'distribution': 'fixed', 'value': 0.005}
+    支持的分布：fixed(value)、uniform(low, high)、normal(mean, std)、lognormal(mu, sigma)，单位为秒。
+    """
+
+    def __init__(self, rules=None, seed=0):
+        self.rules = list(rules or [])
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self, query):
+        """为查询抽样一个延迟（秒）"""
+        for rule in self.rules:
+            if rule.get('match') and rule['match'] not in query:
+                continue
+            with self._lock:
+                return max(0.0, self._draw(rule))
+        return 0.0
+
+    def _draw(self, rule):
+        distribution = rule.get('distribution', 'fixed')
+        if distribution == 'fixed':
+            return rule.get('value', 0.0)
+        if distribution == 'uniform':
+            return self._random.uniform(rule.get('low', 0.0), rule.get('high', 0.0))
+        if distribution == 'normal':
+            return self._random.gauss(rule.get('mean', 0.0), rule.get('std', 0.0))
+        if distribution == 'lognormal':
+            return self._random.lognormvariate(rule.get('mu', 0.0), rule.get('sigma', 0.0))
+        raise ValueError(f"不支持的延迟分布: {distribution}")
+
+
+class ReplayTimeoutError(Exception):
+    """回放时注入的延迟超过事务超时，错误码与 Neo4j 事务超时一致"""
+    code = 'Neo.ClientError.Transaction.TransactionTimedOut'
+
+
+class ReplayRecord(dict):
+    """回放结果记录，提供与 neo4j Record 相同的常用方法"""
+
+    def data(self):
+        return dict(self)
+
+    def value(self, key=0):
+        return list(self.values())[key] if isinstance(key, int) else self[key]
+
+
+class ReplayResult:
+    """回放查询结果，提供与 neo4j Result 相同的常用方法"""
+
+    def __init__(self, rows):
+        self._rows = rows
+
+    def __iter__(self):
+        return (ReplayRecord(row) for row in self._rows)
+
+    def data(self):
+        return [dict(row) for row in self._rows]
+
+    def single(self):
+        return ReplayRecord(self._rows[0]) if self._rows else None
+
+    def consume(self):
+        """回放结果没有服务端耗时和执行计划"""
+        return None
+
+
+class ReplaySession:
+    """回放会话：按夹具返回结果并注入延迟"""
+
+    def __init__(self, driver):
+        self._driver = driver
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        pass
+
+    def run(self, query, parameters=None, **kwargs):
+        driver = self._driver
+        text = _query_text(query)
+        params = dict(parameters or {}, **kwargs)
+        delay = driver.latency.sample(text)
+        timeout = query.timeout if isinstance(query, Query) else None
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise ReplayTimeoutError(f"查询超过事务超时 {timeout:.3f} 秒")
+        if delay:
+            time.sleep(delay)
+
+        rows = driver.fixture.get(text, params)
+        with driver.lock:
+            if rows is None:
+                driver.misses += 1
+            else:
+                driver.hits += 1
+        if rows is None:
+            print(f"回放夹具中没有该查询: {text} 参数: {params}")
+            rows = []
+        return ReplayResult(rows)
+
+
+class ReplayDriver:
+    """回放驱动，替代 neo4j 驱动"""
+
+    def __init__(self, fixture, latency):
+        self.fixture = fixture
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def session(self, **kwargs):
+        return ReplaySession(self)
+
+    def close(self):
+        pass
+
+
+class RecordingSession:
+    """录制会话：执行真实查询，结果写入夹具后返回"""
+
+    def __init__(self, session, fixture):
+        self._session = session
+        self._fixture = fixture
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self._session.close()
+
+    def run(self, query, parameters=None, **kwargs):
+        params = dict(parameters or {}, **kwargs)
+        rows = self._session.run(query, params).data()
+        self._fixture.put(_query_text(query), params, rows)
+        return ReplayResult(rows)
+
+
+class RecordingDriver:
+    """录制驱动，包装真实的 neo4j 驱动"""
+
+    def __init__(self, driver, fixture):
+        self._driver = driver
+        self.fixture = fixture
+
+    def session(self, **kwargs):
+        return RecordingSession(self._driver.session(**kwargs), self.fixture)
+
+    def close(self):
+        self._driver.close()
+
+
+class RecordingNeo4jClient(Neo4jClient):
+    """
+    录制模式客户端：连接真实数据库，录制的查询结果每隔 flush_interval 秒及关闭时写入夹具文件，
+    worker 进程被强制结束时最多丢失一个间隔内的录制结果
+    """
+
+    def __init__(self, fixture_path, flush_interval=30.0, **config):
+        self.fixture = QueryFixture(fixture_path)
+        # 录制时每条查询都要访问数据库，不使用实体级缓存
+        super().__init__(**dict(config, entity_cache=None))
+        self._stop_flush = threading.Event()
+        self._flusher = None
+        if flush_interval:
+            self._flusher = threading.Thread(
+                target=self._flush_loop, args=(flush_interval,), name='fixture-flusher', daemon=True
+            )
+            self._flusher.start()
+
+    def _create_driver(self, uri, user, password, **pool_options):
+        return RecordingDriver(super()._create_driver(uri, user, password, **pool_options), self.fixture)
+
+    def _flush_loop(self, interval):
+        """定期写入录制结果"""
+        while not self._stop_flush.wait(interval):
+            self.flush()
+
+    def flush(self):
+        """有新录制的结果时写入夹具文件"""
+        if not self.fixture.dirty:
+            return
+        try:
+            total = self.fixture.save()
+            print(f"已录制 {len(self.fixture)} 条查询到 {self.fixture.path}（合并后共 {total} 条）")
+        except Exception as e:
+            self.fixture.dirty = True
+            print(f"写入夹具文件失败: {str(e)}")
+
+    def close(self):
+        self._stop_flush.set()
+        self.flush()
+        super().close()
+
+
+class ReplayNeo4jClient(Neo4jClient):
+    """回放模式客户端：不连接数据库，按夹具文件返回结果"""
+
+    def __init__(self, fixture_path, latency=None, seed=0, uri=None, user=None, password=None, **config):
+        # 连接参数（uri、用户名、连接池等）忽略，查询执行参数与真实客户端一致
+        self.fixture = QueryFixture(fixture_path)
+        self.latency = LatencyModel(latency, seed)
+        # 与录制时一样不使用实体级缓存：部分命中时批量查询只带未命中的实体，
+        # 这样的参数组合未录制过，回放会缺失结果
+        super().__init__(uri, user, password, **dict(config, entity_cache=None))
+
+    def _create_driver(self, uri, user, password, **pool_options):
+        print(f"Replaying Neo4j queries from {self.fixture.path} ({len(self.fixture)} queries)")
+        return ReplayDriver(self.fixture, self.latency)
+
+    def stats(self):
+        """回放命中统计"""
+        return {'queries': len(self.fixture), 'hits': self._driver.hits, 'misses': self._driver.misses}
+
+
+def create_client(config, backend):
+    """
+    按后端配置创建客户端
+
+    Args:
+        config: 连接配置（settings.NEO4J_CONFIG）
+        backend: 后端配置（settings.NEO4J_BACKEND），mode 为 live / record / replay
+    """
+    mode = backend.get('mode', 'live')
+    if mode == 'live':
+        return Neo4jClient(**config)
+    if mode == 'record':
+        return RecordingNeo4jClient(backend['fixture'], flush_interval=backend.get('flush_interval', 30.0), **config)
+    if mode == 'replay':
+        return ReplayNeo4jClient(
+            backend['fixture'], latency=backend.get('latency'), seed=backend.get('seed', 0), **config
+        )
+    raise ValueError(f"不支持的Neo4j后端模式: {mode}")
@@ -0,0 +1,105 @@
+# kg_module/schema.py
+
+"""
+知识图谱模式维护
+问答模板和知识图谱更新器都按 name 属性查找节点，
+默认为已知标签建立 name 范围索引，避免全标签扫描；
+唯一约束会拒绝之后导入的重名节点，只在显式要求时建立
+"""
+from nlp_module.query_plan import QUERY_SPECS, RelationPart
+
+# 问答查询涉及的标签 + 知识图谱更新器导入时的默认标签
+KNOWN_LABELS = tuple(dict.fromkeys(
+    [spec.anchor_label for spec in QUERY_SPECS.values()]
+    + [part.target_label for spec in QUERY_SPECS.values() for part in spec.parts if isinstance(part, RelationPart)]
+    + ['Producer', 'Entity']
+))
+
+
+def _quote(identifier):
+    """Cypher 标识符转义"""
+    return '`' + identifier.replace('`', '``') + '`'
+
+
+def schema_name(label, kind):
+    """约束/索引名称"""
+    return f'medkg_{label}_name_{kind}'
+
+
+def graph_labels(client):
+    """图中已有的全部标签"""
+    return [record['label'] for record in client.execute_query("CALL db.labels() YIELD label RETURN label")]
+
+
+def name_indexes(client):
+    """
+    各标签 name 属性上的索引状态
+
+    Returns:
+        dict: 标签 -> {'name', 'type', 'unique', 'state', 'progress'}
+    """
+    indexes = {}
+    for record in client.execute_query("SHOW INDEXES YIELD *"):
+        labels = record.get('labelsOrTypes') or []
+        if record.get('entityType') != 'NODE' or len(labels) != 1 or record.get('properties') != ['name']:
+            continue
+        indexes[labels[0]] = {
+            'name': record.get('name'),
+            'type': record.get('type'),
+            # Neo4j 5 为 owningConstraint，4.x 为 uniqueness
+            'unique': bool(record.get('owningConstraint')) or record.get('uniqueness') == 'UNIQUE',
+            'state': record.get('state'),
+            'progress': record.get('populationPercent'),
+        }
+    return indexes
+
+
+def count_duplicate_names(client, label):
+    """统计标签下重名节点的名称数，有重名时无法建立唯一约束"""
+    query = (f"MATCH (n:{_quote(label)}) WHERE n.name IS NOT NULL "
+             f"WITH n.name AS name, count(*) AS c WHERE c > 1 RETURN count(*) AS duplicates")
+    return client.execute_query(query)[0]['duplicates']
+
+
+def ensure_name_indexes(client, labels=None, unique=False, all_labels=False):
+    """
+    确保每个标签的 name 属性有范围索引或唯一约束，已有索引的标签跳过
+
+    Args:
+        client: Neo4jClient
+        labels: 要处理的标签，默认为已知标签 KNOWN_LABELS
+        unique: 是否优先建立唯一约束；为False或存在重名节点时建立范围索引
+        all_labels: labels 为空时同时处理图中已有的全部标签
+
+    Returns:
+        list: [(标签, 动作)]，动作为 'exists' / 'constraint' / 'index'
+    """
+    if labels is None:
+        labels = list(KNOWN_LABELS)
+        if all_labels:
+            labels = list(dict.fromkeys(labels + graph_labels(client)))
+    existing = name_indexes(client)
+
+    actions = []
+    for label in labels:
+        if label in existing:
+            actions.append((label, 'exists'))
+            continue
+        if unique and count_duplicate_names(client, label) == 0:
+            client.execute_query(
+                f"CREATE CONSTRAINT {_quote(schema_name(label, 'unique'))} IF NOT EXISTS "
+                f"FOR (n:{_quote(label)}) REQUIRE n.name IS UNIQUE"
+            )
+            actions.append((label, 'constraint'))
+        else:
+            client.execute_query(
+                f"CREATE INDEX {_quote(schema_name(label, 'index'))} IF NOT EXISTS "
+                f"FOR (n:{_quote(label)}) ON (n.name)"
+            )
+            actions.append((label, 'index'))
+    return actions
+
+
+def await_indexes(client, timeout=300):
+    """等待所有索引填充完成"""
+    client.execute_query("CALL db.awaitIndexes($timeout)", {'timeout': timeout})
@@ -7,14 +7,14 @@ from rest_framework import status
 import json
 import logging
 import traceback
-from .neo4j_client import Neo4jClient
+from .neo4j_client import get_client
 from .knowledge_graph_updater import KnowledgeGraphUpdater
 from accounts.views import log_system_event
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.conf import settings
-from accounts.models import SystemLog
+from utils.auth import admin_required
 
 # 获取知识图谱统计信息
 @csrf_exempt
@@ -22,7 +22,7 @@ from accounts.models import SystemLog
 def kg_statistics_view(request):
     """获取知识图谱统计信息的视图函数"""
     try:
-        neo4j_client = Neo4jClient(**settings.NEO4J_CONFIG)
+        neo4j_client = get_client()
         
         # 获取实体数量查询
         entity_count_query = "MATCH (n) RETURN count(n) as entityCount"
@@ -46,16 +46,15 @@ def kg_statistics_view(request):
         ORDER BY count DESC
         """
         
-        # 执行查询并获取结果
-        with neo4j_client._driver.session() as session:
-            entity_count = session.run(entity_count_query).single()['entityCount']
-            relation_count = session.run(relation_count_query).single()['relationCount']
-            
-            entity_types_result = session.run(entity_types_query).data()
-            entity_types = [{'type': r['entityType'][0], 'count': r['count']} for r in entity_types_result]
-            
-            relation_types_result = session.run(relation_types_query).data()
-            relation_types = [{'type': r['relationType'], 'count': r['count']} for r in relation_types_result]
+        # 执行查询并获取结果（经由客户端执行，计入查询性能统计）
+        entity_count = neo4j_client.execute_query(entity_count_query)[0]['entityCount']
+        relation_count = neo4j_client.execute_query(relation_count_query)[0]['relationCount']
+        
+        entity_types_result = neo4j_client.execute_query(entity_types_query)
+        entity_types = [{'type': r['entityType'][0], 'count': r['count']} for r in entity_types_result]
+        
+        relation_types_result = neo4j_client.execute_query(relation_types_query)
+        relation_types = [{'type': r['relationType'], 'count': r['count']} for r in relation_types_result]
         
         # 构建响应数据
         data = {
@@ -68,7 +67,7 @@ def kg_statistics_view(request):
         return JsonResponse({'success': True, 'data': data})
     except Exception as e:
         # 记录错误到系统日志
-        SystemLog.objects.create(
+        log_system_event(
             level='ERROR',
             module='kg_statistics',
             message=f'获取知识图谱统计信息失败: {str(e)}',
@@ -92,7 +91,7 @@ def kg_visualization_view(request):
         except:
             limit = 25
             
-        neo4j_client = Neo4jClient(**settings.NEO4J_CONFIG)
+        neo4j_client = get_client()
         
         # 根据查询类型构建不同的查询
         if query_type == 'disease_only':
@@ -104,25 +103,24 @@ def kg_visualization_view(request):
             """
             
             # 执行查询
-            with neo4j_client._driver.session() as session:
-                result = session.run(query).data()
-                
-                # 处理结果，构建可视化所需的数据格式
-                nodes = []
-                for item in result:
-                    node = item['n']
-                    if 'name' in node:
-                        nodes.append({
-                            'id': node['name'],
-                            'label': node['name'],
-                            'group': 'Disease'
-                        })
-                
-                # 构建响应数据
-                data = {
-                    'nodes': nodes,
-                    'links': []
-                }
+            result = neo4j_client.execute_query(query)
+            
+            # 处理结果，构建可视化所需的数据格式
+            nodes = []
+            for item in result:
+                node = item['n']
+                if 'name' in node:
+                    nodes.append({
+                        'id': node['name'],
+                        'label': node['name'],
+                        'group': 'Disease'
+                    })
+            
+            # 构建响应数据
+            data = {
+                'nodes': nodes,
+                'links': []
+            }
         else:
             # 基本关系查询
             query = f"""
@@ -132,48 +130,47 @@ def kg_visualization_view(request):
             """
             
             # 执行查询
-            with neo4j_client._driver.session() as session:
-                result = session.run(query).data()
-                
-                # 处理结果，构建可视化所需的数据格式
-                nodes_dict = {}
-                links = []
+            result = neo4j_client.execute_query(query)
+            
+            # 处理结果，构建可视化所需的数据格式
+            nodes_dict = {}
+            links = []
+            
+            for item in result:
+                source = item['source']
+                target = item['target']
+                relation = item['relation']
+                source_type = item['sourceType']
+                target_type = item['targetType']
                 
-                for item in result:
-                    source = item['source']
-                    target = item['target']
-                    relation = item['relation']
-                    source_type = item['sourceType']
-                    target_type = item['targetType']
+                if source and target:  # 确保源和目标都有值
+                    # 添加节点到字典
+                    if source not in nodes_dict:
+                        nodes_dict[source] = {'id': source, 'label': source, 'group': source_type}
+                    if target not in nodes_dict:
+                        nodes_dict[target] = {'id': target, 'label': target, 'group': target_type}
                     
-                    if source and target:  # 确保源和目标都有值
-                        # 添加节点到字典
-                        if source not in nodes_dict:
-                            nodes_dict[source] = {'id': source, 'label': source, 'group': source_type}
-                        if target not in nodes_dict:
-                            nodes_dict[target] = {'id': target, 'label': target, 'group': target_type}
-                        
-                        # 添加关系
-                        links.append({
-                            'source': source,
-                            'target': target,
-                            'relation': relation
-                        })
-                
-                # 为节点构建对象
-                nodes = list(nodes_dict.values())
-                
-                # 构建响应数据
-                data = {
-                    'nodes': nodes,
-                    'links': links
-                }
+                    # 添加关系
+                    links.append({
+                        'source': source,
+                        'target': target,
+                        'relation': relation
+                    })
+            
+            # 为节点构建对象
+            nodes = list(nodes_dict.values())
+            
+            # 构建响应数据
+            data = {
+                'nodes': nodes,
+                'links': links
+            }
         
         return JsonResponse({'success': True, 'data': data})
     except Exception as e:
         # 记录错误到系统日志
         error_msg = f'获取知识图谱可视化数据失败: {str(e)}'
-        SystemLog.objects.create(
+        log_system_event(
             level='ERROR',
             module='kg_visualization',
             message=error_msg,
@@ -208,7 +205,7 @@ def kg_update_view(request):
             
             # 创建知识图谱更新器并处理文件
             updater = KnowledgeGraphUpdater()
-            updater.neo4j_client = Neo4jClient(**settings.NEO4J_CONFIG)
+            updater.neo4j_client = get_client()
             
             # 根据文件类型不同调用不同的处理函数
             if uploaded_file.name.endswith('.json'):
@@ -219,7 +216,7 @@ def kg_update_view(request):
                 result = updater.process_txt_file(file_path)
                 
             # 记录更新信息
-            SystemLog.objects.create(
+            log_system_event(
                 level='INFO',
                 module='kg_update',
                 message=f'通过文件更新知识图谱成功，文件名: {uploaded_file.name}, 添加节点: {result["nodes_added"]}, 添加关系: {result["relations_added"]}'
@@ -245,14 +242,14 @@ def kg_update_view(request):
             
             # 创建并初始化知识图谱更新器
             updater = KnowledgeGraphUpdater()
-            # 使用配置创建Neo4j客户端
-            updater.neo4j_client = Neo4jClient(**settings.NEO4J_CONFIG)
+            # 使用共享的Neo4j客户端
+            updater.neo4j_client = get_client()
             
             # 执行更新操作
             result = updater.update_knowledge_graph(search_term)
             
             # 记录更新信息到系统日志
-            SystemLog.objects.create(
+            log_system_event(
                 level='INFO',
                 module='kg_update',
                 message=f'知识图谱更新成功，关键词: {search_term}, 添加节点: {result["nodes_added"]}, 添加关系: {result["relations_added"]}'
@@ -271,7 +268,7 @@ def kg_update_view(request):
         error_msg = f'更新知识图谱失败: {str(e)}'
         
         # 记录错误到系统日志
-        SystemLog.objects.create(
+        log_system_event(
             level='ERROR',
             module='kg_update',
             message=error_msg,
@@ -292,7 +289,7 @@ def search_knowledge_graph(request):
                 'message': '搜索关键词不能为空'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        neo4j_client = Neo4jClient()
+        neo4j_client = get_client()
         
         # 基于关键词搜索节点
         query = """
@@ -327,4 +324,73 @@ def search_knowledge_graph(request):
         return Response({
             'success': False,
             'message': error_msg
-        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR) 
\ No newline at end of file
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR) 
+
+# 查询性能统计
+@csrf_exempt
+@admin_required
+@require_http_methods(['GET', 'POST'])
+def kg_query_profile_view(request):
+    """
+    Cypher 查询性能统计
+    GET 返回按查询指纹汇总的耗时统计和慢查询日志，参数 order_by（默认 total_time）、limit（默认50）；
+    POST {"action": "profile", "query": "查询文本或指纹，可选", "count": 1} 对接下来匹配的查询采集 PROFILE 执行计划，
+    POST {"action": "reset"} 清空统计
+    """
+    profiler = get_client().profiler
+    if request.method == 'GET':
+        try:
+            limit = int(request.GET.get('limit', 50))
+        except ValueError:
+            limit = 50
+        return JsonResponse({
+            'success': True,
+            'data': profiler.snapshot(request.GET.get('order_by', 'total_time'), limit)
+        })
+
+    try:
+        data = json.loads(request.body.decode('utf-8') or '{}')
+        action = data.get('action')
+        if action == 'profile':
+            profiler.request_profile(data.get('query'), int(data.get('count', 1)))
+            log_system_event("INFO", "KG_API", f"管理员 {request.user.name} 请求采集查询执行计划")
+            return JsonResponse({'success': True, 'message': '匹配的查询下次执行时将采集执行计划'})
+        if action == 'reset':
+            profiler.reset()
+            log_system_event("INFO", "KG_API", f"管理员 {request.user.name} 清空查询统计")
+            return JsonResponse({'success': True, 'message': '查询统计已清空'})
+        return JsonResponse({'success': False, 'message': f'不支持的操作: {action}'}, status=400)
+
+    except (json.JSONDecodeError, ValueError, TypeError) as e:
+        return JsonResponse({'success': False, 'message': '请求参数格式错误', 'error': str(e)}, status=400)
+
+# 实体级结果缓存
+@csrf_exempt
+@admin_required
+@require_http_methods(['GET', 'POST'])
+def kg_entity_cache_view(request):
+    """
+    实体级结果缓存
+    GET 返回缓存统计；
+    POST {"entity": "实体名称，可选", "question_type": "问题类型，可选"} 清除匹配的缓存条目，都不传时清空全部
+    """
+    neo4j_client = get_client()
+    if neo4j_client.entity_cache is None:
+        return JsonResponse({'success': False, 'message': '实体级缓存未启用'}, status=400)
+    if request.method == 'GET':
+        return JsonResponse({'success': True, 'data': neo4j_client.entity_cache.stats()})
+
+    try:
+        data = json.loads(request.body.decode('utf-8') or '{}')
+    except json.JSONDecodeError as e:
+        return JsonResponse({'success': False, 'message': '请求参数格式错误', 'error': str(e)}, status=400)
+
+    entity = data.get('entity') or None
+    question_type = data.get('question_type') or None
+    purged = neo4j_client.purge_entity_cache(entity, question_type)
+    log_system_event(
+        "INFO", "KG_API",
+        f"管理员 {request.user.name} 清除实体级缓存 {purged} 条（实体: {entity or '全部'}，问题类型: {question_type or '全部'}）"
+    )
+    return JsonResponse({'success': True, 'data': {'purged': purged}})
+
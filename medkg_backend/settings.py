@@ -102,7 +102,84 @@ CORS_ALLOW_HEADERS = [
 NEO4J_CONFIG = {
     'uri': 'bolt://localhost:7687',
     'user': 'neo4j',
-    'password': '012134whz'  # 修改为实际密码
+    'password': '012134whz',  # 修改为实际密码
+    # 连接池配置：进程内所有视图共享一个驱动
+    'max_connection_pool_size': 50,  # 连接池最大连接数
+    'connection_acquisition_timeout': 30,  # 获取连接的最长等待时间（秒）
+    'max_connection_lifetime': 3600,  # 连接最长存活时间（秒），超过后重建
+    # 并发查询配置：多条查询的问题并发执行
+    'query_workers': 16,  # 进程内并发查询线程总数（0 表示串行），应小于连接池最大连接数
+    'query_parallelism': 4,  # 单个问题同时执行的查询数上限
+    'fetch_size': 1000,  # 流式读取查询结果时每批拉取的记录数
+    # 实体级结果缓存：(问题类型, 实体) -> 结果行，知识图谱版本号变化后清空
+    'entity_cache': {
+        'enabled': True,
+        'max_entries': 50000,
+        'max_bytes': 32 * 1024 * 1024,
+        'track_kg_version': True,
+    },
+    # 查询性能统计：按查询指纹汇总耗时，超过阈值（秒）的查询记入慢查询日志
+    'profiling': {'enabled': True, 'slow_threshold': 0.5, 'slow_log_size': 200},
+}
+
+# Neo4j 后端：live 连接真实数据库；record 连接真实数据库并把查询结果录制到夹具文件；
+# replay 不连接数据库，按夹具文件回放结果，用于离线压测和回归测试
+NEO4J_BACKEND = {
+    'mode': os.environ.get('MEDKG_NEO4J_BACKEND', 'live'),
+    'fixture': os.environ.get('MEDKG_NEO4J_FIXTURE', str(BASE_DIR / 'kg_module' / 'fixtures' / 'neo4j_replay.json')),
+    # 回放时注入的延迟，按顺序取第一条匹配的规则，例如：
+    # {'match': 'has_symptom', 'distribution': 'lognormal', 'mu': -3, 'sigma': 0.8}
+    # {'distribution': 'uniform', 'low': 0.002, 'high': 0.01}
+    'latency': [],
+    'seed': 0,  # 延迟抽样的随机种子，保证回放可复现
+    'flush_interval': 30,  # 录制模式下定期写入夹具文件的间隔（秒），多个 worker 写入同一文件时合并
+}
+
+# 知识图谱版本文件，每次写入知识图谱后递增，问答结果缓存据此判断条目是否过期
+KG_VERSION_FILE = os.environ.get('MEDKG_KG_VERSION_FILE', str(BASE_DIR / 'kg_module' / 'kg_version'))
+
+# 问答NLP配置
+NLP_CONFIG = {
+    # 实体消歧模式: all(保留全部重叠命中) / longest(最长非重叠) / span(覆盖最大+图谱度数决胜)
+    'entity_mode': 'longest',
+    # 词典文件变更监测间隔（秒），0 表示关闭，变更后自动在后台重载分类器；
+    # 管理接口的重载通过词典文件、加词通过增量词文件通知各 worker 进程，多进程部署时需开启
+    'watch_interval': 5,
+    # 精确匹配不到实体时启用基于二元组索引的模糊匹配
+    'fuzzy': True,
+    # 多实体问题按问题类型合并为 UNWIND 批量查询
+    'batch_queries': True,
+    # 单次问答的查询时间预算（秒），超时的问题类型返回部分结果，不配置则不限时
+    'deadline': 2.0,
+    # 同一实体上的多个问题类型融合为一条 OPTIONAL MATCH 查询，一次往返取回
+    'fuse_queries': True,
+    # 按实体聚合问答结果，每个实体一条结果，同一关系的目标合并为 targets 列表（响应格式变化，前端适配后开启）
+    'aggregate_results': False,
+    # 问题解析缓存：条目数上限、字节数上限、过期时间（秒）
+    'cache': {
+        'max_entries': 10000,
+        'max_bytes': 64 * 1024 * 1024,
+        'ttl': 3600,
+    },
+    # 问答结果缓存：按知识图谱版本号失效，不设过期时间；部分结果不缓存
+    # shared 为多个 worker 进程共用的后端，例如 {'backend': 'sqlite', 'path': str(BASE_DIR / 'qa_api' / 'answer_cache.sqlite3')}
+    'answer_cache': {
+        'enabled': True,
+        'max_entries': 10000,
+        'max_bytes': 64 * 1024 * 1024,
+        'shared': None,
+    },
+}
+
+# 日志批量写入：UserLog/SystemLog 放入有界队列，后台线程按条数或时间间隔 bulk_create
+# policy 为队列满时的处理策略：drop_newest（丢弃新日志）/ drop_oldest（丢弃最早的日志）/ block（等待 block_timeout 秒后丢弃）
+LOG_WRITER = {
+    'enabled': True,  # False 时在请求线程中同步写入
+    'max_queue': 10000,
+    'batch_size': 200,
+    'flush_interval': 1.0,  # 秒
+    'policy': 'drop_newest',
+    'block_timeout': 0.05,  # 秒
 }
 
 # 配置MySQL数据库  新增
@@ -20,7 +20,7 @@ from django.urls import path
 from django.http import JsonResponse
 
 from accounts import views as account_views
-from qa_api.views import medical_qa, get_history, clear_history
+from qa_api.views import medical_qa, medical_qa_async, get_history, clear_history, reload_classifier, add_classifier_words
 from kg_module import views as kg_views
 
 
@@ -30,6 +30,7 @@ def home(request):
         'message': 'Welcome to the Medical KG QA System!',
         'endpoints': {
             'qa': '/api/qa/',
+            'qa_async': '/api/qa/async/',
             'history': '/api/history/',
             'history/clear': '/api/history/clear/',
             'auth': {
@@ -46,7 +47,12 @@ def home(request):
             'admin': {
                 'user-logs': '/api/admin/logs/user/',
                 'system-logs': '/api/admin/logs/system/',
-                'feedbacks': '/api/admin/feedbacks/'
+                'log-writer': '/api/admin/logs/writer/',
+                'feedbacks': '/api/admin/feedbacks/',
+                'nlp-reload': '/api/admin/nlp/reload/',
+                'nlp-words': '/api/admin/nlp/words/',
+                'kg-profile': '/api/admin/kg/profile/',
+                'kg-cache': '/api/admin/kg/cache/'
             },
             'kg': {
                 'statistics': '/api/kg/statistics/',
@@ -60,6 +66,7 @@ def home(request):
 urlpatterns = [
     path('', home),  # 根路径
     path('api/qa/', medical_qa, name='medical_qa'),  # QA接口
+    path('api/qa/async/', medical_qa_async, name='medical_qa_async'),  # QA接口（异步，ASGI部署使用）
     path('api/history/', get_history, name='get_history'),  # 获取历史记录
     path('api/history/clear/', clear_history, name='clear_history'),  # 清空历史记录
     path('admin/', admin.site.urls, name='admin'),
@@ -81,6 +88,9 @@ urlpatterns = [
     path('api/admin/login/', account_views.admin_login, name='admin_login'),
     path('api/admin/logs/user/', account_views.get_user_logs, name='get_user_logs'),
     path('api/admin/logs/system/', account_views.get_system_logs, name='get_system_logs'),
+    path('api/admin/logs/writer/', account_views.log_writer_status, name='log_writer_status'),  # 日志写入器状态
+    path('api/admin/nlp/reload/', reload_classifier, name='reload_classifier'),
+    path('api/admin/nlp/words/', add_classifier_words, name='add_classifier_words'),
     
     # 日志记录
     path('api/logs/chat/', account_views.record_chat_log, name='record_chat_log'),
@@ -90,4 +100,6 @@ urlpatterns = [
     path('api/kg/visualization/', kg_views.kg_visualization_view, name='kg_visualization'),
     path('api/kg/update/', kg_views.kg_update_view, name='kg_update'),
     path('api/kg/search/', kg_views.search_knowledge_graph, name='search_knowledge_graph'),
+    path('api/admin/kg/profile/', kg_views.kg_query_profile_view, name='kg_query_profile'),  # 查询性能统计
+    path('api/admin/kg/cache/', kg_views.kg_entity_cache_view, name='kg_entity_cache'),  # 实体级结果缓存
 ]
\ No newline at end of file
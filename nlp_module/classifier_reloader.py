@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+可热加载的问题分类器
+在后台线程中重建分类器，完成后原子替换引用，进行中的请求不受影响；
+重载请求落到词典文件上，新增词追加到增量词文件，各 worker 进程的文件监测线程
+据此各自全量重载或只增量应用新增的词
+"""
+import os
+import time
+import logging
+import threading
+
+from .question_classifier import DICT_DIR, DICT_TYPES, REGION_TYPES
+
+logger = logging.getLogger('nlp_module')
+
+# 通过管理接口新增的词，每行 "实体类型\t词"；与词典文件分开保存，
+# 监测线程发现该文件增长时只增量应用新增的行，不全量重建
+OVERLAY_FILE = 'added_words.txt'
+
+
+class ReloadableClassifier:
+    """
+    双缓冲的分类器持有者
+
+    请求方每次通过 current 取得当前分类器实例；重载时新实例在后台线程构建，
+    构建完成后一次赋值完成切换，旧实例随最后一个引用它的请求结束而释放。
+    """
+
+    def __init__(self, factory, dict_dir=DICT_DIR, initial=None):
+        """
+        Args:
+            factory: 无参函数，返回新的 QuestionClassifier 实例
+            dict_dir: 词典目录，用于文件变更监测和增量词持久化
+            initial: 可选，初始分类器实例（如主进程预加载的实例），为空时调用 factory 创建
+        """
+        self._factory = factory
+        self.dict_dir = dict_dir
+        self.current = initial if initial is not None else factory()
+        self.version = 1
+        self.last_reload = time.time()
+        self.last_error = None
+
+        self._reload_lock = threading.Lock()
+        self._reload_thread = None
+        self._watcher = None
+        self._stop_watcher = threading.Event()
+        # 监测线程上次看到的词典文件修改时间
+        self._mtimes = None
+        # 保护增量加词和分类器切换：重载时在持锁状态下重新应用增量词文件并切换，
+        # 构建期间新增的词不会丢失
+        self._words_lock = threading.Lock()
+        # 当前分类器已应用到的增量词文件位置（字节）
+        self._overlay_offset = 0
+        # 分类器切换后的回调
+        self._listeners = []
+        with self._words_lock:
+            self._apply_overlay(self.current, from_start=True)
+
+    def add_listener(self, callback):
+        """注册分类器切换回调，callback(classifier)"""
+        self._listeners.append(callback)
+
+    def reload(self, wait=False):
+        """
+        在后台线程中重建分类器
+
+        Returns:
+            bool: 是否启动了新的重载任务（已有重载进行中时返回False）
+        """
+        with self._reload_lock:
+            if self._reload_thread is not None and self._reload_thread.is_alive():
+                started = False
+            else:
+                self._reload_thread = threading.Thread(
+                    target=self._do_reload, name='classifier-reload', daemon=True
+                )
+                self._reload_thread.start()
+                started = True
+            thread = self._reload_thread
+        if wait:
+            thread.join()
+        return started
+
+    def _do_reload(self):
+        """构建新分类器并替换当前引用"""
+        start = time.time()
+        try:
+            classifier = self._factory()
+            with self._words_lock:
+                # 词典文件不含增量词，切换前重新应用全部增量词（包括构建期间新增的词）
+                self._apply_overlay(classifier, from_start=True)
+                self.current = classifier
+        except Exception as e:
+            self.last_error = str(e)
+            logger.error(f"分类器重载失败: {str(e)}")
+            return
+
+        self.version += 1
+        self.last_reload = time.time()
+        self.last_error = None
+        logger.info(f"分类器重载完成，版本: {self.version}，耗时: {self.last_reload - start:.2f}秒")
+        self._notify(classifier)
+
+    def add_words(self, words, entity_type):
+        """
+        增量添加领域词，不重建全量索引
+
+        新增词同时追加到增量词文件，其他 worker 进程的监测线程发现文件增长后增量应用
+
+        Args:
+            words: 词列表
+            entity_type: 实体类型
+
+        Returns:
+            list: 实际新增的词
+        """
+        with self._words_lock:
+            classifier = self.current
+            added = classifier.add_words(words, entity_type)
+            if not added:
+                return added
+
+            # 本进程读到自己写入的行时 add_words 不会重复添加
+            self._persist_words(added, entity_type)
+        self._notify(classifier)
+        return added
+
+    def _overlay_path(self):
+        return os.path.join(self.dict_dir, OVERLAY_FILE)
+
+    def _persist_words(self, words, entity_type):
+        """将新增词追加到增量词文件（一次写入，多个进程同时追加时行不会交错）"""
+        data = ''.join(f'{entity_type}\t{word}\n' for word in words).encode('utf-8')
+        fd = os.open(self._overlay_path(), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+
+    def _apply_overlay(self, classifier, from_start=False):
+        """
+        持锁调用，将增量词文件中尚未应用的行应用到分类器
+
+        Args:
+            from_start: 从文件开头读取（新构建的分类器），否则从上次读到的位置继续
+
+        Returns:
+            int: 实际新增的词数
+        """
+        offset = 0 if from_start else self._overlay_offset
+        try:
+            with open(self._overlay_path(), 'rb') as f:
+                f.seek(offset)
+                data = f.read()
+        except FileNotFoundError:
+            self._overlay_offset = 0
+            return 0
+        # 只处理完整的行，其他进程写了一半的行留到下次
+        end = data.rfind(b'\n') + 1
+        self._overlay_offset = offset + end
+        words = {}
+        for line in data[:end].decode('utf-8').splitlines():
+            entity_type, _, word = line.partition('\t')
+            if word:
+                words.setdefault(entity_type, []).append(word)
+        added = 0
+        for entity_type, entity_words in words.items():
+            try:
+                added += len(classifier.add_words(entity_words, entity_type))
+            except ValueError as e:
+                logger.error(f"应用增量词失败: {str(e)}")
+        return added
+
+    def _overlay_size(self):
+        try:
+            return os.path.getsize(self._overlay_path())
+        except OSError:
+            return 0
+
+    def _notify(self, classifier):
+        """通知切换回调"""
+        for callback in self._listeners:
+            try:
+                callback(classifier)
+            except Exception as e:
+                logger.error(f"分类器切换回调执行失败: {str(e)}")
+
+    def request_reload(self):
+        """
+        通知所有 worker 进程重载分类器
+
+        更新词典文件修改时间，各进程的监测线程据此重载；本进程立即开始重载。
+
+        Returns:
+            bool: 本进程是否新启动了重载（已在重载中时为False）
+        """
+        now = time.time()
+        for t in DICT_TYPES:
+            try:
+                os.utime(os.path.join(self.dict_dir, f'{t}.txt'), (now, now))
+            except OSError:
+                pass
+        if self._mtimes is not None:
+            self._mtimes = self._dict_mtimes()
+        return self.reload()
+
+    def _dict_mtimes(self, types=DICT_TYPES):
+        """获取词典文件修改时间"""
+        mtimes = {}
+        for t in types:
+            try:
+                mtimes[t] = os.path.getmtime(os.path.join(self.dict_dir, f'{t}.txt'))
+            except OSError:
+                mtimes[t] = None
+        return mtimes
+
+    def start_watcher(self, interval=5.0):
+        """启动词典文件监测线程，文件修改后自动重载"""
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        self._stop_watcher.clear()
+        self._mtimes = self._dict_mtimes()
+        self._watcher = threading.Thread(
+            target=self._watch, args=(interval,), name='classifier-watcher', daemon=True
+        )
+        self._watcher.start()
+
+    def stop_watcher(self):
+        """停止词典文件监测线程"""
+        self._stop_watcher.set()
+
+    def _watch(self, interval):
+        """轮询词典文件修改时间和增量词文件大小"""
+        while not self._stop_watcher.wait(interval):
+            current = self._dict_mtimes()
+            if current != self._mtimes:
+                logger.info("检测到词典文件变更，开始重载分类器")
+                # 已有重载进行中时不更新基准，下次轮询再次发现变更后重试，
+                # 进行中的重载可能读到的是变更前的文件
+                if self.reload():
+                    self._mtimes = current
+                continue
+            size = self._overlay_size()
+            if size < self._overlay_offset:
+                # 增量词文件被截断或替换，全量重载后从头应用
+                logger.info("增量词文件已被替换，开始重载分类器")
+                self.reload()
+            elif size > self._overlay_offset:
+                with self._words_lock:
+                    classifier = self.current
+                    added = self._apply_overlay(classifier)
+                if added:
+                    logger.info(f"已应用其他进程新增的词 {added} 个")
+                    self._notify(classifier)
+
+    def status(self):
+        """分类器状态信息"""
+        return {
+            'version': self.version,
+            'checksum': self.current.checksum,
+            'last_reload': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.last_reload)),
+            'reloading': self._reload_thread is not None and self._reload_thread.is_alive(),
+            'watching': self._watcher is not None and self._watcher.is_alive(),
+            'last_error': self.last_error,
+            'entity_types': list(REGION_TYPES),
+        }
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+实体模糊匹配
+基于字符二元组倒排索引召回候选词，再以有界编辑距离校验，
+用于精确匹配失败时容错识别用户输错的实体
+"""
+from array import array
+from collections import defaultdict
+
+# 间隔二元组前缀，与连续二元组区分
+_GAP = '\x00'
+
+
+def char_grams(text):
+    """
+    字符二元组：连续二元组 + 间隔一个字符的二元组
+    间隔二元组使中间字符写错的短词（如"高x压"）仍能召回
+    """
+    grams = {text[i:i + 2] for i in range(len(text) - 1)}
+    grams.update(_GAP + text[i] + text[i + 2] for i in range(len(text) - 2))
+    return grams
+
+
+def max_distance_for(word):
+    """词允许的最大编辑距离"""
+    return 1 if len(word) <= 5 else 2
+
+
+def substring_distance(word, text, max_dist):
+    """
+    计算 word 与 text 中任意子串的最小编辑距离
+
+    Returns:
+        tuple: (距离, 子串起始位置, 子串结束位置)，距离超过 max_dist 时返回 None
+    """
+    m = len(word)
+    prev = list(range(m + 1))
+    prev_start = [0] * (m + 1)
+    best = (prev[m], 0, 0) if prev[m] <= max_dist else None
+    for j, ch in enumerate(text, 1):
+        # 子串可从任意位置开始，首行距离为0
+        cur = [0]
+        cur_start = [j]
+        for i in range(1, m + 1):
+            substitute = prev[i - 1] + (word[i - 1] != ch)
+            delete = prev[i] + 1
+            insert = cur[i - 1] + 1
+            if substitute <= delete and substitute <= insert:
+                cur.append(substitute)
+                cur_start.append(prev_start[i - 1])
+            elif delete <= insert:
+                cur.append(delete)
+                cur_start.append(prev_start[i])
+            else:
+                cur.append(insert)
+                cur_start.append(cur_start[i - 1])
+        if cur[m] <= max_dist:
+            # 距离相同时优先与词长一致的子串（替换优于增删）
+            candidate = (cur[m], cur_start[m], j)
+            if best is None or _match_key(candidate, m) < _match_key(best, m):
+                best = candidate
+        prev, prev_start = cur, cur_start
+    return best
+
+
+def _match_key(match, length):
+    """匹配结果排序键：编辑距离优先，其次子串长度与词长之差"""
+    distance, start, end = match
+    return distance, abs(end - start - length)
+
+
+def _match_windows(word, char_positions, text_length, max_dist):
+    """
+    可能包含匹配子串的文本区间，从左到右排列、互不重叠
+
+    距离不超过 max_dist 的子串长度不超过 词长 + max_dist，且至少含一个词中的字符，
+    只需在词中字符每次出现的位置两侧各扩展该长度的区间内计算，结果与在全文中计算相同
+    """
+    span = len(word) + max_dist
+    windows = []
+    for i in sorted(i for ch in set(word) for i in char_positions.get(ch, ())):
+        lo, hi = max(0, i - span + 1), min(text_length, i + span)
+        if windows and lo <= windows[-1][1]:
+            windows[-1][1] = max(windows[-1][1], hi)
+        else:
+            windows.append([lo, hi])
+    return windows
+
+
+class FuzzyMatcher:
+    """字符二元组倒排索引 + 有界编辑距离校验的模糊匹配器"""
+
+    def __init__(self, word_masks, min_length=3):
+        """
+        Args:
+            word_masks: 词 -> 类型位掩码
+            min_length: 参与模糊匹配的最短词长，过短的词容错意义不大
+        """
+        self.words = []
+        self.masks = array('I')
+        self.gram_counts = array('H')
+        postings = defaultdict(lambda: array('I'))
+        for word, mask in word_masks.items():
+            if len(word) < min_length:
+                continue
+            word_id = len(self.words)
+            grams = char_grams(word)
+            self.words.append(word)
+            self.masks.append(mask)
+            self.gram_counts.append(len(grams))
+            for gram in grams:
+                postings[gram].append(word_id)
+        self.postings = dict(postings)
+
+    def lookup(self, text, max_candidates=32, min_score=0.6, limit=5):
+        """
+        模糊查找文本中可能包含的实体
+
+        Args:
+            text: 问题文本
+            max_candidates: 进入编辑距离校验的候选词数量上限
+            min_score: 最低得分，得分 = 1 - 编辑距离 / 词长
+            limit: 返回结果数量上限
+
+        Returns:
+            list: [{'word', 'mask', 'score', 'distance', 'matched', 'start', 'end'}]，按得分降序
+        """
+        shared = defaultdict(int)
+        for gram in char_grams(text):
+            for word_id in self.postings.get(gram, ()):
+                shared[word_id] += 1
+        if not shared:
+            return []
+
+        # 按命中二元组占比排序召回候选，同占比时依次按词长、词本身排序，
+        # 候选集合与索引构建顺序（重载前后可能不同）无关
+        words = self.words
+        candidates = sorted(
+            shared, key=lambda word_id: (-shared[word_id] / self.gram_counts[word_id],
+                                         -len(words[word_id]), words[word_id])
+        )[:max_candidates]
+
+        # 字符 -> 在文本中的位置，用于缩小编辑距离计算的范围
+        char_positions = defaultdict(list)
+        for i, ch in enumerate(text):
+            char_positions[ch].append(i)
+
+        results = []
+        for word_id in candidates:
+            word = words[word_id]
+            max_dist = max_distance_for(word)
+            match = None
+            for lo, hi in _match_windows(word, char_positions, len(text), max_dist):
+                window_match = substring_distance(word, text[lo:hi], max_dist)
+                if window_match is None:
+                    continue
+                window_match = (window_match[0], window_match[1] + lo, window_match[2] + lo)
+                if match is None or _match_key(window_match, len(word)) < _match_key(match, len(word)):
+                    match = window_match
+            if match is None:
+                continue
+            distance, start, end = match
+            score = 1 - distance / len(word)
+            if score < min_score:
+                continue
+            results.append({
+                'id': word_id,
+                'word': word,
+                'mask': self.masks[word_id],
+                'score': round(score, 4),
+                'distance': distance,
+                'matched': text[start:end],
+                'start': start,
+                'end': end,
+            })
+        # 同分时依次按词长、二元组命中占比、词本身排序，结果与索引构建顺序无关
+        results.sort(key=lambda r: (
+            -r['score'], -len(r['word']), -shared[r['id']] / self.gram_counts[r['id']], r['word']
+        ))
+        for r in results:
+            del r['id']
+        return results[:limit]
+
+    def resolve(self, text, **kwargs):
+        """按得分从高到低选取互不重叠的匹配结果"""
+        selected = []
+        for result in self.lookup(text, **kwargs):
+            if all(result['end'] <= s['start'] or result['start'] >= s['end'] for s in selected):
+                selected.append(result)
+        return selected
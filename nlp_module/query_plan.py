@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+问答查询规格与查询融合
+描述每种问题类型查询的锚点实体、关系、方向和返回内容，
+预编译为参数化Cypher语句，并可将同一锚点实体上的多个问题类型融合为一条语句
+"""
+from collections import namedtuple
+
+# 关系查询：锚点经 relation 关系连接到 target_label 节点；reverse 为True时锚点是关系终点
+RelationPart = namedtuple('RelationPart', ['relation', 'target_label', 'reverse'])
+# 属性查询：返回锚点节点的 property 属性
+PropertyPart = namedtuple('PropertyPart', ['property'])
+# 问题类型查询规格：锚点实体类型、锚点节点标签、查询部件
+QuerySpec = namedtuple('QuerySpec', ['entity_type', 'anchor_label', 'parts'])
+# 预编译的查询计划：锚点实体类型、参数化Cypher语句
+QueryPlan = namedtuple('QueryPlan', ['entity_type', 'statements'])
+
+QUERY_SPECS = {
+    'disease_symptom': QuerySpec('disease', 'Disease', (RelationPart('has_symptom', 'Symptom', False),)),
+    'symptom_disease': QuerySpec('symptom', 'Symptom', (RelationPart('has_symptom', 'Disease', True),)),
+    'disease_cause': QuerySpec('disease', 'Disease', (PropertyPart('cause'),)),
+    'disease_acompany': QuerySpec('disease', 'Disease', (RelationPart('acompany_with', 'Disease', False),)),
+    'disease_not_food': QuerySpec('disease', 'Disease', (RelationPart('not_eat', 'Food', False),)),
+    'disease_do_food': QuerySpec('disease', 'Disease', (
+        RelationPart('do_eat', 'Food', False),
+        RelationPart('recommand_eat', 'Food', False),
+    )),
+    'food_not_disease': QuerySpec('food', 'Food', (RelationPart('not_eat', 'Disease', True),)),
+    'food_do_disease': QuerySpec('food', 'Food', (
+        RelationPart('do_eat', 'Disease', True),
+        RelationPart('recommand_eat', 'Disease', True),
+    )),
+    'disease_drug': QuerySpec('disease', 'Disease', (
+        RelationPart('common_drug', 'Drug', False),
+        RelationPart('recommand_drug', 'Drug', False),
+    )),
+    'drug_disease': QuerySpec('drug', 'Drug', (
+        RelationPart('common_drug', 'Disease', True),
+        RelationPart('recommand_drug', 'Disease', True),
+    )),
+    'disease_check': QuerySpec('disease', 'Disease', (RelationPart('need_check', 'Check', False),)),
+    'check_disease': QuerySpec('check', 'Check', (RelationPart('need_check', 'Disease', True),)),
+    'disease_prevent': QuerySpec('disease', 'Disease', (PropertyPart('prevent'),)),
+    'disease_lasttime': QuerySpec('disease', 'Disease', (PropertyPart('cure_lasttime'),)),
+    'disease_cureway': QuerySpec('disease', 'Disease', (PropertyPart('cure_way'),)),
+    'disease_cureprob': QuerySpec('disease', 'Disease', (PropertyPart('cured_prob'),)),
+    'disease_easyget': QuerySpec('disease', 'Disease', (PropertyPart('easy_get'),)),
+    'disease_desc': QuerySpec('disease', 'Disease', (PropertyPart('desc'),)),
+    'disease_department': QuerySpec('disease', 'Disease', (RelationPart('belong_to', 'Department', False),)),
+}
+
+
+def compile_statement(anchor_label, part):
+    """将单个查询部件编译为参数化Cypher语句，返回列与原有查询模板一致"""
+    if isinstance(part, PropertyPart):
+        return f"MATCH (m:{anchor_label}) WHERE m.name = $name RETURN m.name, m.{part.property}"
+    if part.reverse:
+        return (f"MATCH (m:{part.target_label})-[r:{part.relation}]->(n:{anchor_label}) "
+                f"WHERE n.name = $name RETURN m.name, r.name, n.name")
+    return (f"MATCH (m:{anchor_label})-[r:{part.relation}]->(n:{part.target_label}) "
+            f"WHERE m.name = $name RETURN m.name, r.name, n.name")
+
+
+def compile_plans(specs=QUERY_SPECS):
+    """预编译全部问题类型的查询计划"""
+    return {
+        question_type: QueryPlan(
+            spec.entity_type,
+            tuple(compile_statement(spec.anchor_label, part) for part in spec.parts)
+        )
+        for question_type, spec in specs.items()
+    }
+
+
+# 模块加载时编译一次，各解析器实例共享
+QUERY_PLANS = compile_plans()
+
+
+def fuse_queries(queries):
+    """
+    查询融合：同一锚点实体上的多个问题类型合并为一条 OPTIONAL MATCH + collect() 语句
+
+    融合后的查询组带有 'fusion' 拆分计划，Neo4jClient 执行后据此还原为各问题类型的原始行格式。
+    批量（UNWIND）查询组和只涉及一个问题类型的锚点保持不变。
+    """
+    anchors = {}
+    for index, query in enumerate(queries):
+        spec = QUERY_SPECS.get(query['question_type'])
+        name = (query.get('params') or {}).get('name')
+        if spec is None or name is None:
+            continue
+        anchors.setdefault((spec.anchor_label, name), []).append(index)
+
+    fused_at = {}
+    skipped = set()
+    for (anchor_label, name), indexes in anchors.items():
+        question_types = list(dict.fromkeys(queries[i]['question_type'] for i in indexes))
+        if len(question_types) < 2:
+            continue
+        fused_at[indexes[0]] = build_fused_query(anchor_label, name, question_types)
+        skipped.update(indexes)
+
+    fused = []
+    for index, query in enumerate(queries):
+        if index in fused_at:
+            fused.append(fused_at[index])
+        elif index not in skipped:
+            fused.append(query)
+    return fused
+
+
+def build_fused_query(anchor_label, name, question_types):
+    """
+    构建锚点实体的融合查询
+
+    每个关系部件一段 OPTIONAL MATCH，紧接 WITH collect() 收敛为列表，避免多段匹配间的笛卡尔积；
+    属性部件直接在 RETURN 中取锚点属性。
+    """
+    lines = [f"MATCH (a:{anchor_label}) WHERE a.name = $name"]
+    carried = ['a']
+    returns = ['a.name AS anchor']
+    plan = []
+    for question_type in question_types:
+        for part in QUERY_SPECS[question_type].parts:
+            column = f'c{len(plan)}'
+            if isinstance(part, PropertyPart):
+                returns.append(f'a.{part.property} AS {column}')
+                plan.append({
+                    'question_type': question_type, 'kind': 'property',
+                    'column': column, 'property': part.property
+                })
+                continue
+
+            pattern = (f"(a)<-[r{column}:{part.relation}]-(t{column}:{part.target_label})" if part.reverse
+                       else f"(a)-[r{column}:{part.relation}]->(t{column}:{part.target_label})")
+            lines.append(f"OPTIONAL MATCH {pattern}")
+            lines.append(
+                f"WITH {', '.join(carried)}, "
+                f"collect(CASE WHEN t{column} IS NOT NULL THEN [r{column}.name, t{column}.name] END) AS {column}"
+            )
+            carried.append(column)
+            returns.append(column)
+            plan.append({
+                'question_type': question_type, 'kind': 'relation',
+                'column': column, 'reverse': part.reverse
+            })
+    lines.append(f"RETURN {', '.join(returns)}")
+
+    return {
+        'question_type': 'fused',
+        'fused_types': question_types,
+        'sql': ['\n'.join(lines)],
+        'params': {'name': name},
+        'fusion': plan
+    }
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+问题解析结果缓存
+以归一化后的问题为键，缓存问题分类与查询语句生成的结果
+"""
+import re
+import sys
+import time
+import threading
+from collections import OrderedDict
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_question(question):
+    """
+    问题归一化：去除首尾空白，连续空白合并为一个空格
+
+    归一化结果同时用作缓存键和分类器的输入（见 qa_api.views.parse_question），
+    键相同的问题分类结果必然相同。不做大小写、全半角转换或去除标点：
+    词典中的词区分这些字符（如 "维生素C片"、"人凝血因子Ⅷ"、"β-内酰胺酶"），转换后分类结果会改变
+    """
+    return _WHITESPACE.sub(' ', question).strip()
+
+
+def estimate_size(value):
+    """粗略估算对象占用的字节数（递归计算容器内元素）"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item) for item in value)
+    return size
+
+
+class QuestionCache:
+    """
+    线程安全的LRU缓存，支持条目数上限、字节数上限和过期时间
+
+    clear() 会递增代数，清空前开始计算、清空后才写入的结果会被丢弃，
+    避免词典重载后写入旧分类器的结果。
+    """
+
+    def __init__(self, max_entries=10000, max_bytes=64 * 1024 * 1024, ttl=3600):
+        """
+        Args:
+            max_entries: 最大条目数
+            max_bytes: 最大字节数（估算值）
+            ttl: 过期时间（秒），0 表示不过期
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (value, size, expire_at)
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, question):
+        """读取缓存，未命中返回None"""
+        key = normalize_question(question)
+        with self._lock:
+            return self._get(key)
+
+    def _get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, size, expire_at = entry
+        if expire_at and expire_at < time.time():
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def get_or_set(self, question, compute):
+        """
+        读取缓存，未命中时调用 compute() 计算并写入
+
+        compute 在锁外执行，并发的相同问题可能各自计算一次。
+        """
+        key = normalize_question(question)
+        with self._lock:
+            value = self._get(key)
+            generation = self._generation
+        if value is not None:
+            return value
+
+        value = compute()
+        self._set(key, value, generation)
+        return value
+
+    def set(self, question, value):
+        """写入缓存"""
+        with self._lock:
+            generation = self._generation
+        self._set(normalize_question(question), value, generation)
+
+    def _set(self, key, value, generation):
+        size = estimate_size(key) + estimate_size(value)
+        if size > self.max_bytes:
+            return
+        expire_at = time.time() + self.ttl if self.ttl else 0
+        with self._lock:
+            if generation != self._generation:
+                return
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, size, expire_at)
+            self.current_bytes += size
+            while len(self._data) > self.max_entries or self.current_bytes > self.max_bytes:
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key):
+        _, size, _ = self._data.pop(key)
+        self.current_bytes -= size
+
+    def clear(self, *args):
+        """清空缓存（可直接注册为分类器重载回调）"""
+        with self._lock:
+            self._data.clear()
+            self.current_bytes = 0
+            self._generation += 1
+
+    def stats(self):
+        """缓存统计信息"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._data),
+                'bytes': self.current_bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+                'evictions': self.evictions,
+            }
@@ -5,40 +5,195 @@
 使用AC自动机进行快速特征匹配，支持7类医疗实体识别和17种问题分类
 """
 import os
+import gc
+import pickle
+import bisect
+import hashlib
+import multiprocessing
+from collections import deque
+from itertools import islice
+import threading
 import ahocorasick
 from typing import Dict, List, Set, Union
 
+from .fuzzy_matcher import FuzzyMatcher
+
+
+CUR_DIR = os.path.dirname(os.path.abspath(__file__))
+DICT_DIR = os.path.join(CUR_DIR, 'dict')
+
+# 词典类型，顺序即类型位掩码中的位序，也是 classify 输出中类型列表的顺序
+DICT_TYPES = ('disease', 'department', 'check', 'drug', 'food', 'producer', 'symptom', 'deny')
+# 参与实体识别的领域词典类型
+REGION_TYPES = ('department', 'disease', 'check', 'drug', 'food', 'producer', 'symptom')
+
+# 预编译产物默认路径，可通过环境变量覆盖
+ARTIFACT_PATH = os.environ.get(
+    'MEDKG_CLASSIFIER_ARTIFACT',
+    os.path.join(CUR_DIR, 'build', 'classifier.pkl')
+)
+# 产物格式版本，数据结构变化时递增，旧产物会被自动重建
+ARTIFACT_VERSION = 2
+
+# 自动机payload为整数：高位存词长，低 MASK_BITS 位存类型位掩码
+MASK_BITS = 8
+MASK_FILTER = (1 << MASK_BITS) - 1
+
+# 问题类型判定规则，按输出顺序排列：
+# (实体类型, 关键词类别, 问题类型, 含否定词时的问题类型)
+QUESTION_RULES = (
+    ('disease', 'symptom', 'disease_symptom', None),
+    ('symptom', 'symptom', 'symptom_disease', None),
+    ('disease', 'cause', 'disease_cause', None),
+    ('disease', 'acompany', 'disease_acompany', None),
+    ('disease', 'food', 'disease_do_food', 'disease_not_food'),
+    ('disease', 'drug', 'disease_drug', None),
+    ('drug', 'cure', 'drug_disease', None),
+    ('disease', 'check', 'disease_check', None),
+    ('check', 'cure', 'check_disease', None),
+    ('disease', 'prevent', 'disease_prevent', None),
+    ('disease', 'lasttime', 'disease_lasttime', None),
+    ('disease', 'cureway', 'disease_cureway', None),
+    ('disease', 'cureprob', 'disease_cureprob', None),
+    ('disease', 'easyget', 'disease_easyget', None),
+    ('disease', 'belong', 'disease_department', None),
+)
+
+# 实体消歧模式：
+# all     - 保留全部重叠命中（原始行为）
+# longest - 最长优先、从左到右的非重叠匹配
+# span    - 最大化覆盖字符数的非重叠匹配，同等覆盖时按图谱节点度数择优
+ENTITY_MODES = ('all', 'longest', 'span')
+
+
+def dict_checksum(dict_dir=DICT_DIR):
+    """计算全部词典文件的校验和"""
+    digest = hashlib.sha256()
+    for t in DICT_TYPES:
+        digest.update(t.encode('utf-8'))
+        with open(os.path.join(dict_dir, f'{t}.txt'), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def build_artifact(dict_dir=DICT_DIR, checksum=None):
+    """
+    编译词典为分类器产物
+    
+    产物包含：
+    - automaton: 领域词AC自动机（整数payload，见 pack_payload），同时作为词 -> 类型位掩码表
+    - deny: 否定词列表
+    """
+    word_dict = {}
+    for t in DICT_TYPES:
+        with open(os.path.join(dict_dir, f'{t}.txt'), encoding='utf-8') as f:
+            word_dict[t] = [line.strip() for line in f if line.strip()]
+
+    # 线性构建词类型位掩码，替代逐类型列表 in 查找
+    masks = {}
+    for bit, t in enumerate(DICT_TYPES):
+        for word in word_dict[t]:
+            masks[word] = masks.get(word, 0) | (1 << bit)
+
+    region_mask = 0
+    for t in REGION_TYPES:
+        region_mask |= 1 << DICT_TYPES.index(t)
+
+    automaton = ahocorasick.Automaton(ahocorasick.STORE_INTS)
+    for word, mask in masks.items():
+        if mask & region_mask:
+            automaton.add_word(word, pack_payload(word, mask))
+    automaton.make_automaton()
+
+    return {
+        'version': ARTIFACT_VERSION,
+        'checksum': checksum or dict_checksum(dict_dir),
+        'types': DICT_TYPES,
+        'automaton': automaton,
+        'deny': word_dict['deny'],
+    }
+
+
+def pack_payload(word, mask):
+    """自动机payload编码：词长与类型位掩码合为一个整数，匹配时不产生Python对象"""
+    return len(word) << MASK_BITS | mask
+
+
+def save_artifact(artifact, path=ARTIFACT_PATH):
+    """原子写入产物文件，避免并发启动的worker读到半写文件"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(artifact, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def load_artifact(path=ARTIFACT_PATH, checksum=None):
+    """加载产物，版本或校验和不匹配时返回None"""
+    try:
+        with open(path, 'rb') as f:
+            artifact = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None
+    if not isinstance(artifact, dict) or artifact.get('version') != ARTIFACT_VERSION:
+        return None
+    if artifact.get('types') != DICT_TYPES:
+        return None
+    if checksum is not None and artifact.get('checksum') != checksum:
+        return None
+    return artifact
+
+
+def load_or_build_artifact(path=ARTIFACT_PATH, dict_dir=DICT_DIR, save=True):
+    """优先加载预编译产物，词典变化时重新编译"""
+    checksum = dict_checksum(dict_dir)
+    artifact = load_artifact(path, checksum)
+    if artifact is None:
+        artifact = build_artifact(dict_dir, checksum)
+        if save:
+            try:
+                save_artifact(artifact, path)
+            except OSError:
+                # 产物目录不可写时仅使用内存中的结果
+                pass
+    return artifact
+
 
 class QuestionClassifier:
-    def __init__(self):
-        """初始化问题分类器"""
-        # 加载字典文件
-        cur_dir = os.path.dirname(os.path.abspath(__file__))
-        dict_files = {
-            'disease': os.path.join(cur_dir, 'dict/disease.txt'),
-            'department': os.path.join(cur_dir, 'dict/department.txt'),
-            'check': os.path.join(cur_dir, 'dict/check.txt'),
-            'drug': os.path.join(cur_dir, 'dict/drug.txt'),
-            'food': os.path.join(cur_dir, 'dict/food.txt'),
-            'producer': os.path.join(cur_dir, 'dict/producer.txt'),
-            'symptom': os.path.join(cur_dir, 'dict/symptom.txt'),
-            'deny': os.path.join(cur_dir, 'dict/deny.txt')
-        }
+    def __init__(self, artifact_path=None, entity_mode='all', entity_degree=None, dict_dir=DICT_DIR,
+                 fuzzy=False):
+        """
+        初始化问题分类器
         
-        # 加载词典
-        self.word_dict = {}
-        for key, file_path in dict_files.items():
-            with open(file_path, encoding='utf-8') as f:
-                self.word_dict[key] = [line.strip() for line in f if line.strip()]
-                
-        # 构建领域词表
-        self.region_words = set()
-        for key in ['department', 'disease', 'check', 'drug', 'food', 'producer', 'symptom']:
-            self.region_words.update(self.word_dict[key])
-            
-        # 构建AC自动机
-        self.region_tree = self.build_actree(list(self.region_words))
-        self.wdtype_dict = self.build_wdtype_dict()
+        Args:
+            artifact_path: 预编译产物路径
+            dict_dir: 词典目录
+            entity_mode: 实体消歧模式，见 ENTITY_MODES
+            entity_degree: 可选，(词, 实体类型元组) -> 图谱节点度数的函数，用于 span 模式覆盖相同时的决胜
+            fuzzy: 精确匹配不到实体时是否启用模糊匹配
+        """
+        if entity_mode not in ENTITY_MODES:
+            raise ValueError(f"不支持的实体消歧模式: {entity_mode}")
+        self.entity_mode = entity_mode
+        self.entity_degree = entity_degree
+        
+        # 加载预编译的词典产物（校验和不一致时自动重建）
+        self.artifact_path = artifact_path or ARTIFACT_PATH
+        self.dict_dir = dict_dir
+        artifact = load_or_build_artifact(self.artifact_path, dict_dir)
+        self.checksum = artifact['checksum']
+        # 自动机即词表：词 -> 类型位掩码只存一份，命中词由原文切片得到，类型名按需解码
+        self.region_tree = artifact['automaton']
+        self.deny_words = artifact['deny']
+        # 位掩码 -> 类型名列表，不同掩码只有少数几种
+        self._mask_types = {}
+        # 增量添加的词：独立的小自动机，与主自动机一起匹配，避免重建全量索引
+        self.extra_tree = None
+        self.extra_masks = {}
+        # 模糊匹配索引在首次使用时构建
+        self.fuzzy = fuzzy
+        self._fuzzy_matcher = None
+        self._fuzzy_lock = threading.Lock()
         
         # 问题类型关键词
         self.question_config = {
@@ -56,121 +211,326 @@ class QuestionClassifier:
             'belong': set(['属于什么科', '属于', '什么科', '科室']),
             'cure': set(['治疗什么', '治啥', '治疗啥', '医治啥'])
         }
+
+        # 问题关键词与否定词合并为一个AC自动机，一次扫描得到全部触发类别
+        self.keyword_categories = tuple(self.question_config) + ('deny',)
+        self.category_bits = {c: 1 << i for i, c in enumerate(self.keyword_categories)}
+        self.question_tree = self.build_question_tree()
         
     def classify(self, question):
         """问题分类主函数"""
+        return self.expand_result(self.classify_compact(question))
+
+    def classify_compact(self, question):
+        """
+        紧凑形式的问题分类，便于批量处理和跨进程传输
+        
+        Returns:
+            tuple: ((词, 类型位掩码), ...), (问题类型, ...)；未识别到实体时返回空元组。
+            模糊匹配命中时追加第三项 ((词, 得分, 编辑距离, 原文片段), ...)
+        """
         # 提取问题中的实体
-        medical_dict = self.extract_entities(question)
-        if not medical_dict:
-            return {}
+        entity_masks = self._match_entities(question)
+        fuzzy_matches = ()
+        if not entity_masks and self.fuzzy:
+            # 精确匹配失败时退回模糊匹配
+            matches = self.fuzzy_matcher.resolve(question)
+            entity_masks = {m['word']: m['mask'] for m in matches}
+            fuzzy_matches = tuple((m['word'], m['score'], m['distance'], m['matched']) for m in matches)
+        if not entity_masks:
+            return ()
             
         # 确定问题类型
-        entity_types = {t for types in medical_dict.values() for t in types}
+        union_mask = 0
+        for mask in entity_masks.values():
+            union_mask |= mask
+        entity_types = set(self._decode_types(union_mask))
         question_types = self._determine_question_type(question, entity_types)
         
-        # 返回分类结果
-        return {
-            'args': medical_dict,
-            'question_types': question_types or self._get_default_type(entity_types)
+        compact = (
+            tuple(entity_masks.items()),
+            tuple(question_types or self._get_default_type(entity_types))
+        )
+        return compact + (fuzzy_matches,) if fuzzy_matches else compact
+
+    def expand_result(self, compact):
+        """将紧凑分类结果还原为 classify 的输出格式"""
+        if not compact:
+            return {}
+        entities, question_types = compact[:2]
+        result = {
+            'args': {word: self._decode_types(mask) for word, mask in entities},
+            'question_types': list(question_types)
         }
+        if len(compact) > 2:
+            result['fuzzy'] = [
+                {'word': word, 'score': score, 'distance': distance, 'matched': matched}
+                for word, score, distance, matched in compact[2]
+            ]
+        return result
+
+    @property
+    def fuzzy_matcher(self):
+        """模糊匹配器，首次访问时构建（不含厂商词，避免误召回）"""
+        if self._fuzzy_matcher is None:
+            with self._fuzzy_lock:
+                if self._fuzzy_matcher is None:
+                    producer_bit = 1 << DICT_TYPES.index('producer')
+                    self._fuzzy_matcher = FuzzyMatcher({
+                        word: mask for word, mask in self.iter_word_masks() if mask & ~producer_bit
+                    })
+        return self._fuzzy_matcher
+
+    def classify_many(self, questions, workers=1, chunksize=256, compact=False):
+        """
+        批量问题分类，按输入顺序流式返回结果
         
-    def build_actree(self, wordlist):
-        """构建AC自动机"""
-        actree = ahocorasick.Automaton()
-        for i, word in enumerate(wordlist):
-            actree.add_word(word, (i, word))
-        actree.make_automaton()
-        return actree
+        多进程模式下子进程通过fork继承已加载的自动机，任务只传输问题文本和紧凑结果；
+        不支持fork的平台上子进程从预编译产物加载分类器。
+        
+        Args:
+            questions: 问题可迭代对象
+            workers: 进程数，1 表示在当前进程内处理
+            chunksize: 每个任务包含的问题数
+            compact: 为True时返回 classify_compact 格式的结果
+        """
+        if workers <= 1:
+            for question in questions:
+                result = self.classify_compact(question)
+                yield result if compact else self.expand_result(result)
+            return
+
+        global _pool_classifier
+        if 'fork' in multiprocessing.get_all_start_methods():
+            _pool_classifier = self
+            ctx = multiprocessing.get_context('fork')
+            pool = ctx.Pool(workers)
+        else:
+            ctx = multiprocessing.get_context('spawn')
+            pool = ctx.Pool(workers, initializer=_init_pool_classifier,
+                            initargs=(self.artifact_path, self.entity_mode, self.fuzzy))
+
+        # 限制在途任务数量，避免一次性读入全部输入
+        pending = deque()
+        max_pending = workers * 4
+        chunks = _iter_chunks(questions, chunksize)
+        try:
+            for chunk in chunks:
+                pending.append(pool.apply_async(_classify_chunk, (chunk,)))
+                if len(pending) >= max_pending:
+                    yield from self._drain(pending.popleft(), compact)
+            while pending:
+                yield from self._drain(pending.popleft(), compact)
+        finally:
+            pool.terminate()
+            pool.join()
+            _pool_classifier = None
+
+    def _drain(self, async_result, compact):
+        """取出一个批次的结果"""
+        for result in async_result.get():
+            yield result if compact else self.expand_result(result)
         
     def build_wdtype_dict(self):
         """构建词类型映射字典"""
-        wdtype_dict = {}
-        for word in self.region_words:
-            wdtype_dict[word] = []
-            for t, words in self.word_dict.items():
-                if word in words:
-                    wdtype_dict[word].append(t)
-        return wdtype_dict
+        return {word: self._decode_types(mask) for word, mask in self.iter_word_masks()}
+
+    def iter_word_masks(self):
+        """遍历主词表中的 (词, 类型位掩码)"""
+        for word, payload in self.region_tree.items():
+            yield word, payload & MASK_FILTER
+
+    def word_mask(self, word):
+        """查询词在主词表中的类型位掩码，不存在时为0"""
+        return self.region_tree.get(word, 0) & MASK_FILTER
+
+    def _decode_types(self, mask):
+        """将类型位掩码解码为类型名列表"""
+        types = self._mask_types.get(mask)
+        if types is None:
+            types = [t for bit, t in enumerate(DICT_TYPES) if mask & (1 << bit)]
+            self._mask_types[mask] = types
+        return list(types)
         
-    def extract_entities(self, text):
+    def extract_entities(self, text, mode=None):
         """实体抽取"""
-        medical_dict = {}
-        for end_index, (_, word) in self.region_tree.iter(text):
-            if word not in medical_dict:
-                medical_dict[word] = self.wdtype_dict[word]
-        return medical_dict
+        return {word: self._decode_types(mask) for word, mask in self._match_entities(text, mode).items()}
+
+    def _match_entities(self, text, mode=None):
+        """实体匹配，返回 词 -> 类型位掩码"""
+        mode = mode or self.entity_mode
+        entity_masks = {}
+        extra_tree = self.extra_tree
+        if mode == 'all' and extra_tree is None:
+            for end_index, payload in self.region_tree.iter(text):
+                word = text[end_index - (payload >> MASK_BITS) + 1:end_index + 1]
+                if word not in entity_masks:
+                    entity_masks[word] = payload & MASK_FILTER
+            return entity_masks
+
+        # 命中区间: (起始位置, 结束位置, 词, 类型位掩码)
+        hits = self._iter_hits(self.region_tree, text)
+        if extra_tree is not None:
+            # 同一区间在主词典和增量词中都命中时合并类型
+            spans = {(start, end): (start, end, word, mask) for start, end, word, mask in hits}
+            for start, end, word, mask in self._iter_hits(extra_tree, text):
+                prev = spans.get((start, end))
+                spans[(start, end)] = (start, end, word, mask | (prev[3] if prev else 0))
+            hits = sorted(spans.values(), key=lambda h: h[1])
+        else:
+            hits = list(hits)
+
+        if mode == 'all':
+            selected = hits
+        elif mode == 'longest':
+            selected = self._resolve_longest(hits)
+        elif mode == 'span':
+            selected = self._resolve_span(hits)
+        else:
+            raise ValueError(f"不支持的实体消歧模式: {mode}")
+
+        for _, _, word, mask in selected:
+            # 增量词可能与主词典中的词重复，合并其类型
+            entity_masks[word] = entity_masks.get(word, 0) | mask
+        return entity_masks
+
+    def add_words(self, words, entity_type):
+        """
+        增量添加领域词，只重建增量词的小自动机
         
+        Args:
+            words: 词列表
+            entity_type: 实体类型，见 REGION_TYPES
+            
+        Returns:
+            list: 实际新增（或新增类型）的词
+        """
+        if entity_type not in REGION_TYPES:
+            raise ValueError(f"不支持的实体类型: {entity_type}")
+        bit = 1 << DICT_TYPES.index(entity_type)
+
+        extra_masks = dict(self.extra_masks)
+        added = []
+        for word in words:
+            word = word.strip()
+            if not word or (self.word_mask(word) | extra_masks.get(word, 0)) & bit:
+                continue
+            extra_masks[word] = extra_masks.get(word, 0) | bit
+            added.append(word)
+        if not added:
+            return added
+
+        actree = ahocorasick.Automaton(ahocorasick.STORE_INTS)
+        for word, mask in extra_masks.items():
+            actree.add_word(word, pack_payload(word, mask | self.word_mask(word)))
+        actree.make_automaton()
+
+        # 先更新掩码表再替换自动机引用，匹配线程始终看到完整的自动机
+        self.extra_masks = extra_masks
+        self.extra_tree = actree
+        return added
+
+    def _iter_hits(self, tree, text):
+        """遍历自动机命中区间 (起始位置, 结束位置, 词, 类型位掩码)"""
+        for end_index, payload in tree.iter(text):
+            start = end_index - (payload >> MASK_BITS) + 1
+            yield start, end_index, text[start:end_index + 1], payload & MASK_FILTER
+
+    def _resolve_longest(self, hits):
+        """最长优先、从左到右选取互不重叠的命中"""
+        selected = []
+        last_end = -1
+        for hit in sorted(hits, key=lambda h: (h[0], h[0] - h[1])):
+            if hit[0] > last_end:
+                selected.append(hit)
+                last_end = hit[1]
+        return selected
+
+    def _resolve_span(self, hits):
+        """
+        加权区间调度：选取覆盖字符数最多的非重叠命中组合，
+        覆盖相同时优先图谱度数之和更大者，再优先实体数更少者；
+        只在两个候选组合覆盖相同时才查询度数
+        """
+        if not hits:
+            return []
+        hits = sorted(hits, key=lambda h: h[1])
+        ends = [h[1] for h in hits]
+        degrees = {}
+
+        def tie_break(selection):
+            """覆盖相同时的比较键 (度数和, -实体数)"""
+            total = 0
+            for i in selection:
+                if i not in degrees:
+                    degrees[i] = self._get_degree(hits[i][2], hits[i][3])
+                total += degrees[i]
+            return total, -len(selection)
+
+        # best[i]: 前i个命中的最优组合 (覆盖字符数, 所选下标)
+        best = [(0, ())]
+        for i, (start, end, _, _) in enumerate(hits):
+            # 结束位置早于当前起点的最后一个命中
+            j = bisect.bisect_left(ends, start, 0, i)
+            candidate = (best[j][0] + end - start + 1, best[j][1] + (i,))
+            current = best[i]
+            if candidate[0] > current[0] or (
+                candidate[0] == current[0] and tie_break(candidate[1]) > tie_break(current[1])
+            ):
+                best.append(candidate)
+            else:
+                best.append(current)
+        return sorted((hits[i] for i in best[-1][1]), key=lambda h: h[0])
+
+    def _get_degree(self, word, mask):
+        """获取实体在图谱中的度数（按类型位掩码对应的标签查询），未配置或查询失败时为0"""
+        if self.entity_degree is None:
+            return 0
+        try:
+            return self.entity_degree(word, tuple(self._decode_types(mask))) or 0
+        except Exception:
+            return 0
+        
+    def build_question_tree(self):
+        """构建问题关键词AC自动机，payload为关键词类别位掩码"""
+        keyword_masks = {}
+        for category, keywords in self.question_config.items():
+            for keyword in keywords:
+                keyword_masks[keyword] = keyword_masks.get(keyword, 0) | self.category_bits[category]
+        for word in self.deny_words:
+            keyword_masks[word] = keyword_masks.get(word, 0) | self.category_bits['deny']
+
+        actree = ahocorasick.Automaton()
+        for keyword, mask in keyword_masks.items():
+            actree.add_word(keyword, mask)
+        actree.make_automaton()
+        return actree
+
+    def _scan_keywords(self, question):
+        """单次扫描问题，返回命中的关键词类别位掩码"""
+        mask = 0
+        for _, keyword_mask in self.question_tree.iter(question):
+            mask |= keyword_mask
+        return mask
+
     def _determine_question_type(self, question, entity_types):
         """确定问题类型"""
         question_types = []
-        
-        # 症状相关判断
-        if 'disease' in entity_types and self._contains_any(question, self.question_config['symptom']):
-            question_types.append('disease_symptom')
-        if 'symptom' in entity_types and self._contains_any(question, self.question_config['symptom']):
-            question_types.append('symptom_disease')
-            
-        # 病因相关判断
-        if 'disease' in entity_types and self._contains_any(question, self.question_config['cause']):
-            question_types.append('disease_cause')
-            
-        # 并发症相关判断
-        if 'disease' in entity_types and self._contains_any(question, self.question_config['acompany']):
-            question_types.append('disease_acompany')
-            
-        # 食物相关判断
-        if 'disease' in entity_types and self._contains_any(question, self.question_config['food']):
-            # 判断是否包含否定词
-            if self._contains_any(question, self.word_dict['deny']):
-                question_types.append('disease_not_food')
-            else:
-                question_types.append('disease_do_food')
-                
-        # 药物相关判断
-        if 'disease' in entity_types and self._contains_any(question, self.question_config['drug']):
-            question_types.append('disease_drug')
-        if 'drug' in entity_types and self._contains_any(question, self.question_config['cure']):
-            question_types.append('drug_disease')
-            
-        # 检查相关判断
-        if 'disease' in entity_types and self._contains_any(question, self.question_config['check']):
-            question_types.append('disease_check')
-        if 'check' in entity_types and self._contains_any(question, self.question_config['cure']):
-            question_types.append('check_disease')
-            
-        # 预防相关判断
-        if 'disease' in entity_types and self._contains_any(question, self.question_config['prevent']):
-            question_types.append('disease_prevent')
-            
-        # 治疗周期相关判断
-        if 'disease' in entity_types and self._contains_any(question, self.question_config['lasttime']):
-            question_types.append('disease_lasttime')
-            
-        # 治疗方式相关判断
-        if 'disease' in entity_types and self._contains_any(question, self.question_config['cureway']):
-            question_types.append('disease_cureway')
-            
-        # 治愈率相关判断
-        if 'disease' in entity_types and self._contains_any(question, self.question_config['cureprob']):
-            question_types.append('disease_cureprob')
-            
-        # 易感人群相关判断
-        if 'disease' in entity_types and self._contains_any(question, self.question_config['easyget']):
-            question_types.append('disease_easyget')
-            
-        # 科室相关判断
-        if 'disease' in entity_types and self._contains_any(question, self.question_config['belong']):
-            question_types.append('disease_department')
-            
+        mask = self._scan_keywords(question)
+        if not mask:
+            return question_types
+
+        deny_bit = self.category_bits['deny']
+        for entity_type, category, question_type, deny_type in QUESTION_RULES:
+            if entity_type in entity_types and mask & self.category_bits[category]:
+                # 饮食类问题需区分宜吃/忌吃
+                if deny_type and mask & deny_bit:
+                    question_types.append(deny_type)
+                else:
+                    question_types.append(question_type)
+                    
         return question_types
         
-    def _contains_any(self, text, keywords):
-        """判断文本是否包含关键词"""
-        for keyword in keywords:
-            if keyword in text:
-                return True
-        return False
-        
     def _get_default_type(self, entity_types):
         """获取默认问题类型"""
         if 'disease' in entity_types:
@@ -180,6 +540,71 @@ class QuestionClassifier:
         return []
 
 
+# prefork服务器主进程中预加载的分类器实例
+_preloaded_classifier = None
+
+
+def preload_classifier(artifact_path=None, dict_dir=DICT_DIR):
+    """
+    在prefork服务器（如gunicorn）主进程中预加载分类器
+
+    加载完成后执行 gc.freeze()，将已有对象移出GC追踪代，
+    fork出的worker进行垃圾回收时不再写入这些对象所在的内存页，
+    从而以写时复制方式共享自动机和词表，而不是每个worker各持一份。
+    """
+    global _preloaded_classifier
+    if _preloaded_classifier is None:
+        _preloaded_classifier = QuestionClassifier(artifact_path, dict_dir=dict_dir)
+        # 模糊匹配索引同样在主进程构建，由worker共享
+        _preloaded_classifier.fuzzy_matcher
+        gc.collect()
+        gc.freeze()
+    return _preloaded_classifier
+
+
+def get_preloaded_classifier(entity_mode='all', entity_degree=None, fuzzy=False):
+    """
+    取得主进程预加载的分类器并应用worker侧配置
+
+    未预加载，或主进程启动后词典文件已修改（校验和不一致）时返回None，
+    由调用方按当前词典重新创建，避免重启的worker沿用过期的词典。
+    """
+    classifier = _preloaded_classifier
+    if classifier is None:
+        return None
+    if classifier.checksum != dict_checksum(classifier.dict_dir):
+        print("词典文件在预加载后已修改，不使用预加载的分类器")
+        return None
+    if entity_mode not in ENTITY_MODES:
+        raise ValueError(f"不支持的实体消歧模式: {entity_mode}")
+    classifier.entity_mode = entity_mode
+    classifier.entity_degree = entity_degree
+    classifier.fuzzy = fuzzy
+    return classifier
+
+
+# 批量分类进程池中使用的分类器实例（fork时由父进程继承）
+_pool_classifier = None
+
+
+def _init_pool_classifier(artifact_path, entity_mode, fuzzy):
+    """spawn模式下的子进程初始化：从预编译产物加载分类器"""
+    global _pool_classifier
+    _pool_classifier = QuestionClassifier(artifact_path, entity_mode=entity_mode, fuzzy=fuzzy)
+
+
+def _classify_chunk(chunk):
+    """子进程任务：分类一个批次的问题"""
+    return [_pool_classifier.classify_compact(question) for question in chunk]
+
+
+def _iter_chunks(iterable, size):
+    """将可迭代对象按固定大小切分为列表"""
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
 if __name__ == '__main__':
     classifier = QuestionClassifier()
     question = "高血压的症状有哪些？"
@@ -0,0 +1,218 @@
+"""
+问答结果缓存
+以归一化后的问题为键缓存完整的问答结果，条目标记写入时的知识图谱版本号，
+知识图谱更新后版本号变化，旧版本的条目读取时视为未命中；
+进程内缓存之外可配置共享后端，多个 worker 进程共用计算结果
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+
+from django.utils.module_loading import import_string
+
+from nlp_module.question_cache import QuestionCache, normalize_question
+
+
+class SQLiteAnswerStore:
+    """
+    基于本地 SQLite 文件的共享后端，同一台机器上的多个 worker 进程共享
+
+    共享后端需要提供 get(键) -> (版本号, 值) 或 None、set(键, 版本号, 值)、clear() 三个方法，
+    值为可JSON序列化的对象；其他存储（如 Redis）按同样接口实现后通过 backend 配置类路径替换。
+    """
+
+    def __init__(self, path, max_entries=100000, timeout=1.0):
+        """
+        Args:
+            path: SQLite 文件路径
+            max_entries: 最大条目数，超出时删除最早写入的条目
+            timeout: 等待其他进程释放写锁的时间（秒）
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._local = threading.local()
+        self._writes = 0
+        self._pruned_version = None
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connect()
+
+    def _connect(self):
+        """每个线程一个连接；fork 出的 worker 进程不复用主进程的连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS answers ('
+                'key TEXT PRIMARY KEY, version INTEGER NOT NULL, value TEXT NOT NULL, updated_at REAL NOT NULL)'
+            )
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        row = self._connect().execute('SELECT version, value FROM answers WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def set(self, key, version, value):
+        conn = self._connect()
+        conn.execute(
+            'INSERT OR REPLACE INTO answers (key, version, value, updated_at) VALUES (?, ?, ?, ?)',
+            (key, version, json.dumps(value, ensure_ascii=False), time.time())
+        )
+        # 版本号变化后删除旧版本的条目，条目数每写入一定次数检查一次
+        if version != self._pruned_version:
+            conn.execute('DELETE FROM answers WHERE version < ?', (version,))
+            self._pruned_version = version
+        self._writes += 1
+        if self._writes % 256 == 0:
+            excess = conn.execute('SELECT COUNT(*) FROM answers').fetchone()[0] - self.max_entries
+            if excess > 0:
+                conn.execute(
+                    'DELETE FROM answers WHERE key IN (SELECT key FROM answers ORDER BY updated_at LIMIT ?)',
+                    (excess,)
+                )
+
+    def clear(self):
+        self._connect().execute('DELETE FROM answers')
+
+
+# 共享后端简称
+STORE_BACKENDS = {
+    'sqlite': SQLiteAnswerStore,
+}
+
+
+def create_store(config):
+    """
+    按配置创建共享后端
+
+    Args:
+        config: {'backend': 'sqlite' 或后端类路径, 其余为后端构造参数}
+    """
+    options = dict(config)
+    backend = options.pop('backend', 'sqlite')
+    store_class = STORE_BACKENDS.get(backend) or import_string(backend)
+    return store_class(**options)
+
+
+class AnswerCache:
+    """
+    带知识图谱版本号的问答结果缓存
+
+    get() 返回的标记记录了读取时的知识图谱版本号和缓存代数，set() 时二者任一变化则不写入，
+    避免把知识图谱更新或词典重载之前开始计算的结果当作新结果缓存。
+    键为 normalize_question 的结果，与分类器的输入相同，键相同的问题分类结果必然相同。
+    共享后端读写失败只记为未命中，不影响问答。
+    """
+
+    def __init__(self, version, enabled=True, max_entries=10000, max_bytes=64 * 1024 * 1024, shared=None):
+        """
+        Args:
+            version: 返回当前知识图谱版本号的函数
+            enabled: 是否启用
+            max_entries: 进程内缓存最大条目数
+            max_bytes: 进程内缓存最大字节数（估算值）
+            shared: 共享后端配置，见 create_store，为空时只使用进程内缓存
+        """
+        self.version = version
+        self.enabled = enabled
+        self._local = QuestionCache(max_entries=max_entries, max_bytes=max_bytes, ttl=0)
+        self.shared = create_store(shared) if shared else None
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.shared_errors = 0
+
+    def get(self, question):
+        """
+        读取与当前知识图谱版本一致的缓存结果
+
+        Returns:
+            tuple: (标记, 缓存值)，未命中时缓存值为None，标记用于写入本次计算的结果
+        """
+        stamp = (self.version(), self._generation)
+        if not self.enabled:
+            return stamp, None
+        key = normalize_question(question)
+
+        entry = self._local.get(key)
+        if entry is not None and entry[0] == stamp[0]:
+            self._count('hits')
+            return stamp, entry[1]
+        if entry is not None:
+            self._count('stale')
+
+        if self.shared is not None:
+            try:
+                entry = self.shared.get(key)
+            except Exception as e:
+                self._count('shared_errors')
+                print(f"读取共享问答缓存失败: {str(e)}")
+                entry = None
+            if entry is not None and entry[0] == stamp[0]:
+                self._local.set(key, tuple(entry))
+                self._count('hits', 'shared_hits')
+                return stamp, entry[1]
+
+        self._count('misses')
+        return stamp, None
+
+    def set(self, question, stamp, value):
+        """写入问答结果，知识图谱版本或缓存代数已变化时丢弃"""
+        if not self.enabled or stamp != (self.version(), self._generation):
+            return
+        key = normalize_question(question)
+        self._local.set(key, (stamp[0], value))
+        if self.shared is not None:
+            try:
+                self.shared.set(key, stamp[0], value)
+            except Exception as e:
+                self._count('shared_errors')
+                print(f"写入共享问答缓存失败: {str(e)}")
+
+    def clear(self, *args):
+        """清空缓存（可直接注册为分类器重载回调）"""
+        with self._lock:
+            self._generation += 1
+        self._local.clear()
+        if self.shared is not None:
+            try:
+                self.shared.clear()
+            except Exception as e:
+                self._count('shared_errors')
+                print(f"清空共享问答缓存失败: {str(e)}")
+
+    def _count(self, *names):
+        with self._lock:
+            for name in names:
+                setattr(self, name, getattr(self, name) + 1)
+
+    def stats(self):
+        """缓存统计信息"""
+        local = self._local.stats()
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'kg_version': self.version(),
+                'entries': local['entries'],
+                'bytes': local['bytes'],
+                'evictions': local['evictions'],
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'stale': self.stale,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+                'shared': type(self.shared).__name__ if self.shared is not None else None,
+                'shared_errors': self.shared_errors,
+            }
@@ -0,0 +1,43 @@
+"""
+编译问题分类器词典
+将 nlp_module/dict 下的词典预编译为序列化产物，worker 启动时直接加载
+用法: python manage.py build_classifier [--output PATH] [--force]
+"""
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from nlp_module.question_classifier import (
+    ARTIFACT_PATH, DICT_DIR, build_artifact, dict_checksum, load_artifact, save_artifact
+)
+
+
+class Command(BaseCommand):
+    help = '将医疗词典编译为问题分类器产物（AC自动机 + 词类型位掩码表）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=ARTIFACT_PATH, help='产物输出路径')
+        parser.add_argument('--dict-dir', default=DICT_DIR, help='词典目录')
+        parser.add_argument('--force', action='store_true', help='校验和未变化时也强制重建')
+
+    def handle(self, *args, **options):
+        output = options['output']
+        dict_dir = options['dict_dir']
+
+        checksum = dict_checksum(dict_dir)
+        if not options['force'] and load_artifact(output, checksum) is not None:
+            self.stdout.write(f'产物已是最新，无需重建: {output} (checksum={checksum[:12]})')
+            return
+
+        start = time.time()
+        artifact = build_artifact(dict_dir, checksum)
+        save_artifact(artifact, output)
+        elapsed = time.time() - start
+
+        self.stdout.write(self.style.SUCCESS(
+            f'分类器产物已生成: {output}\n'
+            f'领域词数量: {len(artifact["automaton"])}, '
+            f'文件大小: {os.path.getsize(output) / 1024:.1f}KB, '
+            f'耗时: {elapsed:.2f}秒, checksum={checksum[:12]}'
+        ))
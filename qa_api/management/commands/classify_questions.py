@@ -0,0 +1,91 @@
+"""
+批量问题分类
+从文本文件或 UserLog 表读取问题，批量分类后输出 NDJSON
+用法:
+    python manage.py classify_questions --input questions.txt --output result.ndjson --workers 4
+    python manage.py classify_questions --from-userlog --since 2025-01-01 --workers 4
+"""
+import sys
+import json
+import time
+from datetime import datetime
+from itertools import tee
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import UserLog
+from nlp_module.question_classifier import QuestionClassifier
+
+
+class Command(BaseCommand):
+    help = '批量分类历史问题，结果以NDJSON格式输出'
+
+    def add_arguments(self, parser):
+        source = parser.add_mutually_exclusive_group(required=True)
+        source.add_argument('--input', help='问题文件路径，每行一个问题，"-" 表示标准输入')
+        source.add_argument('--from-userlog', action='store_true', help='从UserLog表读取问题')
+        parser.add_argument('--since', help='仅处理该日期之后的UserLog记录 (YYYY-MM-DD)')
+        parser.add_argument('--limit', type=int, help='最多处理的记录数')
+        parser.add_argument('--output', default='-', help='输出文件路径，默认为标准输出')
+        parser.add_argument('--workers', type=int, default=1, help='并行进程数')
+        parser.add_argument('--chunksize', type=int, default=256, help='每个任务包含的问题数')
+        parser.add_argument('--entity-mode', help='实体消歧模式，默认使用 NLP_CONFIG 配置')
+
+    def handle(self, *args, **options):
+        nlp_config = getattr(settings, 'NLP_CONFIG', {})
+        entity_mode = options['entity_mode'] or nlp_config.get('entity_mode', 'all')
+        classifier = QuestionClassifier(entity_mode=entity_mode, fuzzy=nlp_config.get('fuzzy', False))
+
+        records = self._read_userlog(options) if options['from_userlog'] else self._read_file(options)
+        # 结果按输入顺序返回，两路迭代器间只缓存在途的记录
+        records, questions = tee(records)
+        questions = (question for _, question in questions)
+        results = classifier.classify_many(
+            questions, workers=options['workers'], chunksize=options['chunksize'], compact=True
+        )
+
+        output = sys.stdout if options['output'] == '-' else open(options['output'], 'w', encoding='utf-8')
+        start = time.time()
+        count = 0
+        try:
+            for (record_id, question), result in zip(records, results):
+                line = {'id': record_id, 'question': question}
+                line.update(classifier.expand_result(result) or {'args': {}, 'question_types': []})
+                output.write(json.dumps(line, ensure_ascii=False) + '\n')
+                count += 1
+        finally:
+            if output is not sys.stdout:
+                output.close()
+
+        self.stderr.write(f'分类完成: {count} 条问题，耗时 {time.time() - start:.2f} 秒')
+
+    def _read_file(self, options):
+        """逐行读取问题文件，记录ID为行号"""
+        stream = sys.stdin if options['input'] == '-' else open(options['input'], encoding='utf-8')
+        try:
+            count = 0
+            for line_no, line in enumerate(stream, 1):
+                question = line.strip()
+                if not question:
+                    continue
+                yield line_no, question
+                count += 1
+                if options['limit'] and count >= options['limit']:
+                    break
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+    def _read_userlog(self, options):
+        """流式读取UserLog中的问题"""
+        queryset = UserLog.objects.order_by('id')
+        if options['since']:
+            try:
+                since = datetime.strptime(options['since'], '%Y-%m-%d')
+            except ValueError:
+                raise CommandError('--since 日期格式应为 YYYY-MM-DD')
+            queryset = queryset.filter(created_at__gte=since)
+        if options['limit']:
+            queryset = queryset[:options['limit']]
+        yield from queryset.values_list('id', 'question').iterator(chunk_size=2000)
@@ -0,0 +1,57 @@
+"""
+建立知识图谱 name 属性的范围索引（或唯一约束），并报告索引状态和填充进度
+用法: python manage.py ensure_kg_indexes [--labels Disease Symptom ...] [--all-labels] [--constraints] [--wait] [--status]
+默认只为已知标签建立范围索引；--all-labels 处理图中全部标签，--constraints 优先建立唯一约束
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from kg_module.neo4j_client import get_client
+from kg_module.schema import await_indexes, ensure_name_indexes, name_indexes
+
+ACTION_TEXT = {
+    'exists': '已存在',
+    'constraint': '新建唯一约束',
+    'index': '新建范围索引',
+}
+
+
+class Command(BaseCommand):
+    help = '为知识图谱各标签的 name 属性建立范围索引或唯一约束，并报告索引状态'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--labels', nargs='+', help='只处理指定标签，默认为问答和导入使用的已知标签')
+        parser.add_argument('--all-labels', action='store_true', help='未指定 --labels 时处理图中已有的全部标签')
+        parser.add_argument('--constraints', action='store_true',
+                            help='没有重名节点的标签建立唯一约束（之后无法再导入重名节点），默认只建立范围索引')
+        parser.add_argument('--wait', action='store_true', help='等待索引填充完成')
+        parser.add_argument('--timeout', type=int, default=300, help='等待索引填充的超时时间（秒）')
+        parser.add_argument('--status', action='store_true', help='只报告索引状态，不做修改')
+
+    def handle(self, *args, **options):
+        client = get_client()
+        try:
+            if not options['status']:
+                actions = ensure_name_indexes(
+                    client, options['labels'], unique=options['constraints'], all_labels=options['all_labels']
+                )
+                for label, action in actions:
+                    self.stdout.write(f'{label}: {ACTION_TEXT[action]}')
+                if options['wait']:
+                    self.stdout.write(f'等待索引填充完成（最长 {options["timeout"]} 秒）...')
+                    await_indexes(client, options['timeout'])
+            indexes = name_indexes(client)
+        except Exception as e:
+            raise CommandError(f'维护知识图谱索引失败: {str(e)}')
+
+        self.stdout.write('\n标签\t索引名称\t类型\t状态\t填充进度')
+        for label in sorted(indexes):
+            index = indexes[label]
+            kind = f"{index['type']}{'（唯一）' if index['unique'] else ''}"
+            progress = f"{index['progress']:.1f}%" if index['progress'] is not None else '-'
+            self.stdout.write(f"{label}\t{index['name']}\t{kind}\t{index['state']}\t{progress}")
+
+        pending = [label for label, index in indexes.items() if index['state'] != 'ONLINE']
+        if pending:
+            self.stdout.write(self.style.WARNING(f'尚未就绪的索引: {", ".join(sorted(pending))}'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'共 {len(indexes)} 个标签的 name 索引已就绪'))
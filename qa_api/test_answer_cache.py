@@ -0,0 +1,46 @@
+"""
+问答结果缓存的键测试
+缓存键与分类器的输入相同，仅大小写或标点不同的问题分类结果可能不同，不能共用缓存条目
+"""
+import os
+import tempfile
+import unittest
+
+from qa_api.answer_cache import AnswerCache
+
+
+class AnswerCacheKeyTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        shared = {'backend': 'sqlite', 'path': os.path.join(self.tmp.name, 'answers.sqlite3')}
+        # 两个实例共用同一个 SQLite 文件，模拟两个 worker 进程
+        self.writer = AnswerCache(lambda: 1, shared=shared)
+        self.reader = AnswerCache(lambda: 1, shared=shared)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _put(self, question, answer):
+        stamp, cached = self.writer.get(question)
+        self.assertIsNone(cached)
+        self.writer.set(question, stamp, answer)
+
+    def test_case_variants_do_not_share_entries(self):
+        self._put('维生素C片治啥', 'drug')
+        self.assertIsNone(self.writer.get('维生素c片治啥')[1])
+        self.assertIsNone(self.reader.get('维生素c片治啥')[1])
+        self.assertEqual(self.reader.get('维生素C片治啥')[1], 'drug')
+
+    def test_punctuation_variants_do_not_share_entries(self):
+        self._put('β-内酰胺酶是什么', 'check')
+        self.assertIsNone(self.writer.get('β内酰胺酶是什么')[1])
+        self.assertIsNone(self.reader.get('β内酰胺酶是什么')[1])
+
+    def test_whitespace_variants_share_entries(self):
+        self._put('糖尿病 有什么症状', 'symptom')
+        self.assertEqual(self.reader.get('  糖尿病\t有什么症状 ')[1], 'symptom')
+
+
+if __name__ == '__main__':
+    unittest.main()
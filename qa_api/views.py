@@ -1,4 +1,5 @@
 from django.http import JsonResponse
+from django.core.handlers.asgi import ASGIRequest
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
@@ -6,19 +7,55 @@ import json
 import traceback
 import logging
 from datetime import datetime
+from functools import lru_cache
 
-from kg_module.neo4j_client import Neo4jClient
-from nlp_module.question_classifier import QuestionClassifier
+from asgiref.sync import sync_to_async
+
+from kg_module.neo4j_client import QueryDeadline, get_client
+from kg_module.async_neo4j_client import get_async_client
+from kg_module.kg_version import get_kg_version
+from nlp_module.question_classifier import QuestionClassifier, get_preloaded_classifier
+from nlp_module.classifier_reloader import ReloadableClassifier
+from nlp_module.question_cache import QuestionCache, normalize_question
 from nlp_module.question_parser import QuestionParser
+from nlp_module.query_plan import fuse_queries
 from accounts.models import UserLog
+from .answer_cache import AnswerCache
 from accounts.views import log_system_event, get_client_ip
+from accounts.log_writer import get_log_writer
+from utils.auth import admin_required
 
 # 创建日志记录器
 logger = logging.getLogger('qa_api')
 
-client = Neo4jClient(**settings.NEO4J_CONFIG)
-classifier = QuestionClassifier()
-parser = QuestionParser()
+client = get_client()
+NLP_CONFIG = getattr(settings, 'NLP_CONFIG', {})
+entity_degree = lru_cache(maxsize=4096)(client.get_entity_degree)
+# 分类器可热加载：medical_qa 每次请求通过 classifier_holder.current 取得当前实例
+# 由 gunicorn.conf.py 在主进程预加载时，worker 直接复用写时复制共享的实例
+classifier_holder = ReloadableClassifier(
+    lambda: QuestionClassifier(
+        entity_mode=NLP_CONFIG.get('entity_mode', 'all'),
+        entity_degree=entity_degree,
+        fuzzy=NLP_CONFIG.get('fuzzy', False)
+    ),
+    initial=get_preloaded_classifier(
+        entity_mode=NLP_CONFIG.get('entity_mode', 'all'),
+        entity_degree=entity_degree,
+        fuzzy=NLP_CONFIG.get('fuzzy', False)
+    )
+)
+if NLP_CONFIG.get('watch_interval'):
+    classifier_holder.start_watcher(NLP_CONFIG['watch_interval'])
+parser = QuestionParser(batch=NLP_CONFIG.get('batch_queries', False))
+
+# 问题解析缓存：归一化问题 -> (分类结果, 查询语句)，词典重载或增量加词后清空
+question_cache = QuestionCache(**NLP_CONFIG.get('cache', {}))
+classifier_holder.add_listener(question_cache.clear)
+
+# 问答结果缓存：条目带知识图谱版本号，知识图谱写入后自动失效，词典重载或增量加词后清空
+answer_cache = AnswerCache(get_kg_version().current, **NLP_CONFIG.get('answer_cache', {}))
+classifier_holder.add_listener(answer_cache.clear)
 
 # 用户问题历史记录（临时存储，生产环境应使用数据库）
 user_history = {}
@@ -26,17 +63,10 @@ user_history = {}
 @csrf_exempt
 @require_http_methods(['GET', 'POST'])
 def medical_qa(request):
+    # 请求级时间预算，从收到请求开始计时
+    deadline = new_deadline()
     try:
-        # 获取原始问题
-        if request.method == 'POST':
-            data = json.loads(request.body.decode('utf-8'))
-            question = data.get('question', '')
-            log_query = data.get('log_query', False)  # 是否记录日志的标志
-            user_id = data.get('user_id', 'anonymous')
-        elif request.method == 'GET':
-            question = request.GET.get('question', '')
-            log_query = request.GET.get('log_query', 'false').lower() == 'true'
-            user_id = request.GET.get('user_id', 'anonymous')
+        question, log_query, user_id = read_qa_request(request)
 
         print(f"\n=== 原始问题 ===\n{question}")
 
@@ -46,118 +76,369 @@ def medical_qa(request):
         # 记录问题
         logger.info(f"User {user_id} question: {question}")
 
-        # 问题分类处理
-        classify_result = classifier.classify(question)
-        print(f"\n=== 分类结果 ===\n{classify_result}")
-
-        # 生成Cypher查询
-        cypher_queries = parser.parser_main(classify_result)
-        print(f"\n=== 生成查询语句 ===")
-        for i, query in enumerate(cypher_queries, 1):
-            print(f"查询{i}: {query['sql']}")
-
-        # 执行所有查询
-        final_results = client.execute_query_set(cypher_queries)
-        # 处理并返回结果
-        processed_results = []
-        for item in final_results:
-            if item.get('properties') or item.get('relations'):
-                result = {
-                    'entity': item.get('main_entity', ''),
-                    'properties': item.get('properties', {}),
-                    'relations': []
-                }
-
-                # 处理关系数据
-                if item.get('relations'):
-                    # 确保处理多个关系
-                    relations = item['relations']
-                    if isinstance(relations, list):  # 处理多个关系的情况
-                        result['relations'] = [{
-                            'source': rel.get('source'),
-                            'relation': rel.get('relation'),
-                            'target': rel.get('target')
-                        } for rel in relations]
-                    else:  # 处理单个关系的情况
-                        result['relations'].append({
-                            'source': relations.get('source'),
-                            'relation': relations.get('relation'),
-                            'target': relations.get('target')
-                        })
-
-                processed_results.append(result)
-
-        print(f"\n=== 最终结果 ===\n{processed_results}")
-
-        # 确定回答状态
-        has_results = len(processed_results) > 0
-        status = 'success' if has_results else 'not_found'
-        
-        # 合并最终答案
-        if not processed_results:
-            final_answer = "未找到相关信息"
+        # 相同归一化问题且知识图谱未更新时直接返回缓存的问答结果
+        stamp, cached = answer_cache.get(question)
+        if cached is not None:
+            response_data, final_answer, status = restore_answer(cached, question, user_id)
         else:
-            final_answer = format_results_to_text(processed_results)
-        
-        # 保存到历史记录
-        save_to_history(user_id, question, final_answer)
-        
-        # 创建响应数据
-        response_data = {
-            'success': True,
-            'code': 200,
-            'message': '请求成功',
-            'data': {
-                'question': question,
-                'results': processed_results
-            }
-        }
+            # 问题分类处理并生成Cypher查询（相同归一化问题直接复用缓存）
+            classify_result, cypher_queries = question_cache.get_or_set(question, lambda: parse_question(question))
+            print_queries(classify_result, cypher_queries)
+
+            # 执行所有查询，结果从游标流式读取，边读取边处理；未完整执行的问题类型记入 failures
+            failures = []
+            final_results = client.iter_query_set(cypher_queries, deadline, failures)
+            response_data, final_answer, status = build_qa_response(question, user_id, classify_result, final_results)
+
+            # 超出时间预算的问题类型标记为部分结果
+            timeout_msg = mark_partial(response_data, question, deadline)
+            if timeout_msg:
+                log_system_event("WARNING", "QA_API", timeout_msg)
+            cache_answer(question, stamp, response_data, final_answer, status, failures)
         
         # 如果请求指定了记录日志，则自动记录
         if log_query:
-            try:
-                # 获取用户信息（如果已登录）
-                user = None
-                if hasattr(request, 'user') and request.user.is_authenticated:
-                    user = request.user
-                
-                # 记录日志
-                UserLog.objects.create(
-                    user=user,
-                    question=question,
-                    answer=final_answer,
-                    status=status,
-                    ip_address=get_client_ip(request)
-                )
-                
-                print(f"\n=== 日志记录成功 ===\n问题: {question}\n状态: {status}")
-            except Exception as e:
-                error_msg = f"记录用户查询日志失败: {str(e)}"
-                log_system_event("ERROR", "QA_API", error_msg, trace=traceback.format_exc())
-                print(f"\n!!! 日志记录异常: {str(e)}")
-                # 日志记录失败不影响问答服务
+            record_user_log(request, question, final_answer, status)
         
         # 返回响应
         return JsonResponse(response_data)
 
     except json.JSONDecodeError as e:
-        return JsonResponse({
-            'success': False,
-            'code': 400,
-            'message': '请求参数格式错误',
-            'error': str(e)
-        }, status=400)
+        return qa_bad_request(e)
 
     except Exception as e:
         error_msg = f"处理医疗问答请求失败: {str(e)}"
         log_system_event("ERROR", "QA_API", error_msg, trace=traceback.format_exc())
         print(f"\n!!! 处理异常: {str(e)}")
+        return qa_server_error(e)
+
+@csrf_exempt
+@require_http_methods(['GET', 'POST'])
+async def medical_qa_async(request):
+    """
+    医疗问答异步版本，用于 ASGI 部署
+    Neo4j 查询走异步驱动，分类和ORM日志等同步操作放到线程池执行，等待期间不占用工作线程；
+    WSGI 部署下每个请求都在新的事件循环中执行，异步驱动的连接池无法复用，改走同步版本
+    """
+    if not isinstance(request, ASGIRequest):
+        return await sync_to_async(medical_qa)(request)
+
+    deadline = new_deadline()
+    try:
+        question, log_query, user_id = read_qa_request(request)
+
+        if not question:
+            return JsonResponse({'error': 'Missing question'}, status=400)
+
+        logger.info(f"User {user_id} question: {question}")
+
+        # 共享缓存后端为同步IO，与分类一样放到线程池执行
+        stamp, cached = await sync_to_async(answer_cache.get, thread_sensitive=False)(question)
+        if cached is not None:
+            response_data, final_answer, status = restore_answer(cached, question, user_id)
+        else:
+            # 分类为CPU密集的同步操作，不需要绑定主线程
+            classify_result, cypher_queries = await sync_to_async(
+                question_cache.get_or_set, thread_sensitive=False
+            )(question, lambda: parse_question(question))
+
+            failures = []
+            final_results = await get_async_client().execute_query_set(cypher_queries, deadline, failures)
+            response_data, final_answer, status = build_qa_response(question, user_id, classify_result, final_results)
+
+            timeout_msg = mark_partial(response_data, question, deadline)
+            if timeout_msg:
+                await sync_to_async(log_system_event)("WARNING", "QA_API", timeout_msg)
+            await sync_to_async(cache_answer, thread_sensitive=False)(
+                question, stamp, response_data, final_answer, status, failures
+            )
+
+        if log_query:
+            await sync_to_async(record_user_log)(request, question, final_answer, status)
+
+        return JsonResponse(response_data)
+
+    except json.JSONDecodeError as e:
+        return qa_bad_request(e)
+
+    except Exception as e:
+        error_msg = f"处理医疗问答请求失败: {str(e)}"
+        await sync_to_async(log_system_event)("ERROR", "QA_API", error_msg, trace=traceback.format_exc())
+        return qa_server_error(e)
+
+def new_deadline():
+    """按 NLP_CONFIG['deadline'] 创建请求级查询时间预算，未配置时不限时"""
+    budget = NLP_CONFIG.get('deadline')
+    return QueryDeadline(budget) if budget else None
+
+def mark_partial(response_data, question, deadline):
+    """
+    将超出时间预算的问题类型标记为部分结果
+
+    Returns:
+        str: 需要记录的超时信息，未超时返回None
+    """
+    response_data['data']['partial'] = bool(deadline and deadline.late)
+    if not response_data['data']['partial']:
+        return None
+    response_data['data']['partial_question_types'] = list(deadline.late)
+    return f"问答查询超出时间预算 {deadline.budget} 秒，部分结果: {', '.join(deadline.late)}，问题: {question}"
+
+def restore_answer(cached, question, user_id):
+    """由缓存的问答结果构建响应，问题文本取本次请求的原文"""
+    response_data = dict(cached['response'])
+    response_data['data'] = dict(response_data['data'], question=question, cached=True)
+    save_to_history(user_id, question, cached['answer'])
+    return response_data, cached['answer'], cached['status']
+
+def cache_answer(question, stamp, response_data, final_answer, status, failures):
+    """缓存问答结果，超出时间预算的部分结果和有查询执行失败的结果不缓存"""
+    response_data['data']['cached'] = False
+    if response_data['data']['partial'] or failures:
+        return
+    answer_cache.set(question, stamp, {'response': response_data, 'answer': final_answer, 'status': status})
+
+def read_qa_request(request):
+    """读取问答请求参数，返回 (问题, 是否记录日志, 用户ID)"""
+    if request.method == 'POST':
+        data = json.loads(request.body.decode('utf-8'))
+        question = data.get('question', '')
+        log_query = data.get('log_query', False)  # 是否记录日志的标志
+        user_id = data.get('user_id', 'anonymous')
+    else:
+        question = request.GET.get('question', '')
+        log_query = request.GET.get('log_query', 'false').lower() == 'true'
+        user_id = request.GET.get('user_id', 'anonymous')
+    return question, log_query, user_id
+
+def print_queries(classify_result, cypher_queries):
+    """打印分类结果和生成的查询语句"""
+    print(f"\n=== 分类结果 ===\n{classify_result}")
+
+    print(f"\n=== 生成查询语句 ===")
+    for i, query in enumerate(cypher_queries, 1):
+        print(f"查询{i}: {query['sql']}")
+
+def build_qa_response(question, user_id, classify_result, final_results):
+    """
+    处理查询结果并构建问答响应
+
+    Returns:
+        tuple: (响应数据, 文本答案, 回答状态)
+    """
+    # 处理并返回结果
+    if NLP_CONFIG.get('aggregate_results', False):
+        processed_results = aggregate_results(final_results)
+    else:
+        processed_results = expand_results(final_results)
+
+    print(f"\n=== 最终结果 ===\n{processed_results}")
+
+    # 确定回答状态
+    has_results = len(processed_results) > 0
+    status = 'success' if has_results else 'not_found'
+    
+    # 合并最终答案
+    if not processed_results:
+        final_answer = "未找到相关信息"
+    else:
+        final_answer = format_results_to_text(processed_results)
+    
+    # 保存到历史记录
+    save_to_history(user_id, question, final_answer)
+    
+    # 创建响应数据
+    response_data = {
+        'success': True,
+        'code': 200,
+        'message': '请求成功',
+        'data': {
+            'question': question,
+            'results': processed_results
+        }
+    }
+    # 通过模糊匹配识别出的实体及其得分
+    if classify_result.get('fuzzy'):
+        response_data['data']['fuzzy_matches'] = classify_result['fuzzy']
+    return response_data, final_answer, status
+
+def record_user_log(request, question, final_answer, status):
+    """记录用户查询日志，失败不影响问答服务"""
+    try:
+        # 获取用户信息（如果已登录）
+        user = None
+        if hasattr(request, 'user') and request.user.is_authenticated:
+            user = request.user
+        
+        # 记录放入后台写入队列，由写入线程批量写入数据库
+        accepted = get_log_writer().submit(
+            UserLog,
+            user=user,
+            question=question,
+            answer=final_answer,
+            status=status,
+            ip_address=get_client_ip(request)
+        )
+        
+        if accepted:
+            print(f"\n=== 日志已提交 ===\n问题: {question}\n状态: {status}")
+        else:
+            print(f"\n!!! 日志写入队列已满，丢弃日志: {question}")
+    except Exception as e:
+        error_msg = f"记录用户查询日志失败: {str(e)}"
+        log_system_event("ERROR", "QA_API", error_msg, trace=traceback.format_exc())
+        print(f"\n!!! 日志记录异常: {str(e)}")
+        # 日志记录失败不影响问答服务
+
+def qa_bad_request(e):
+    """请求参数格式错误响应"""
+    return JsonResponse({
+        'success': False,
+        'code': 400,
+        'message': '请求参数格式错误',
+        'error': str(e)
+    }, status=400)
+
+def qa_server_error(e):
+    """服务器内部错误响应"""
+    return JsonResponse({
+        'success': False,
+        'code': 500,
+        'message': '服务器内部错误',
+        'error': str(e)
+    }, status=500)
+
+@csrf_exempt
+@admin_required
+@require_http_methods(['GET', 'POST'])
+def reload_classifier(request):
+    """
+    重载问题分类器词典
+    GET 返回分类器状态，POST 通知所有 worker 进程在后台线程中重建分类器
+    """
+    if request.method == 'GET':
         return JsonResponse({
-            'success': False,
-            'code': 500,
-            'message': '服务器内部错误',
-            'error': str(e)
-        }, status=500)
+            'success': True,
+            'data': dict(classifier_holder.status(), cache=question_cache.stats(), answer_cache=answer_cache.stats())
+        })
+
+    started = classifier_holder.request_reload()
+    log_system_event("INFO", "QA_API", f"管理员 {request.user.name} 触发分类器重载")
+    return JsonResponse({
+        'success': True,
+        'message': '分类器重载已开始' if started else '分类器正在重载中',
+        'data': classifier_holder.status()
+    })
+
+@csrf_exempt
+@admin_required
+@require_http_methods(['POST'])
+def add_classifier_words(request):
+    """
+    增量添加领域词
+    请求体: {"entity_type": "disease", "words": ["..."]}
+    新增词追加到增量词文件，其他 worker 进程的监测线程读到新增的行后增量生效，不全量重建
+    """
+    try:
+        data = json.loads(request.body.decode('utf-8'))
+        entity_type = data.get('entity_type', '')
+        words = data.get('words', [])
+        if isinstance(words, str):
+            words = [words]
+        if not words:
+            return JsonResponse({'success': False, 'message': '词列表不能为空'}, status=400)
+
+        added = classifier_holder.add_words(words, entity_type)
+        log_system_event("INFO", "QA_API", f"管理员 {request.user.name} 新增{entity_type}词 {len(added)} 个")
+        return JsonResponse({'success': True, 'data': {'entity_type': entity_type, 'added': added}})
+
+    except json.JSONDecodeError as e:
+        return JsonResponse({'success': False, 'message': '请求参数格式错误', 'error': str(e)}, status=400)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+
+def parse_question(question):
+    """问题分类并生成Cypher查询，分类器的输入与问题缓存、问答结果缓存的键相同"""
+    classify_result = classifier_holder.current.classify(normalize_question(question))
+    cypher_queries = parser.parser_main(classify_result)
+    # 同一实体上的多个问题类型融合为一次查询
+    if NLP_CONFIG.get('fuse_queries', False):
+        cypher_queries = fuse_queries(cypher_queries)
+    return classify_result, cypher_queries
+
+def expand_results(final_results):
+    """逐行处理查询结果，每行一个结果条目"""
+    processed_results = []
+    for item in final_results:
+        if item.get('properties') or item.get('relations'):
+            result = {
+                'entity': item.get('main_entity', ''),
+                'properties': item.get('properties', {}),
+                'relations': []
+            }
+
+            # 处理关系数据
+            if item.get('relations'):
+                # 确保处理多个关系
+                relations = item['relations']
+                if isinstance(relations, list):  # 处理多个关系的情况
+                    result['relations'] = [{
+                        'source': rel.get('source'),
+                        'relation': rel.get('relation'),
+                        'target': rel.get('target')
+                    } for rel in relations]
+                else:  # 处理单个关系的情况
+                    result['relations'].append({
+                        'source': relations.get('source'),
+                        'relation': relations.get('relation'),
+                        'target': relations.get('target')
+                    })
+
+            processed_results.append(result)
+    return processed_results
+
+def aggregate_results(final_results):
+    """
+    一次遍历按查询实体聚合查询结果：每个查询实体一个结果条目，属性合并，
+    关系按 (查询实体, 关系, 方向) 分组，关系另一端的实体去重后合并为 targets 列表
+
+    反向关系（symptom_disease、drug_disease、check_disease、food_* 等）中查询实体是关系终点，
+    这些分组的 source 仍为查询实体，reverse 为True，targets 为关系起点
+    """
+    entities = {}
+    relation_groups = {}
+    for item in final_results:
+        if not (item.get('properties') or item.get('relations')):
+            continue
+        entity = item.get('query_entity') or item.get('main_entity', '')
+        result = entities.get(entity)
+        if result is None:
+            result = entities[entity] = {'entity': entity, 'properties': None, 'relations': []}
+
+        if item.get('properties'):
+            if result['properties'] is None:
+                result['properties'] = {}
+            result['properties'].update(item['properties'])
+
+        relation = item.get('relations')
+        if relation:
+            reverse = relation.get('source') != entity and relation.get('target') == entity
+            key = (entity, relation.get('relation'), reverse)
+            group = relation_groups.get(key)
+            if group is None:
+                group = relation_groups[key] = ({
+                    'source': entity,
+                    'relation': relation.get('relation'),
+                    'targets': []
+                }, set())
+                if reverse:
+                    group[0]['reverse'] = True
+                result['relations'].append(group[0])
+            target = relation.get('source') if reverse else relation.get('target')
+            if target not in group[1]:
+                group[1].add(target)
+                group[0]['targets'].append(target)
+    return list(entities.values())
 
 # 辅助函数：将结果格式化为文本
 def format_results_to_text(results):
@@ -188,6 +469,10 @@ def format_results_to_text(results):
                 if rel_type not in relation_groups:
                     relation_groups[rel_type] = []
                 
+                # 聚合模式下一条关系带有多个目标
+                if rel.get('targets'):
+                    relation_groups[rel_type].extend(rel['targets'])
+                    continue
                 target = rel.get('target') or rel.get('source')
                 if target:
                     relation_groups[rel_type].append(target)